@@ -0,0 +1,276 @@
+import random
+from hashlib import blake2b
+
+from scalecodec.base import RuntimeConfigurationObject, ScaleBytes
+from scalecodec.type_registry import load_type_registry_preset
+from scalecodec.utils.ss58 import ss58_encode
+from substrateinterface.utils.hasher import xxh128
+
+from runtime import SPEC_VERSION, TRANSACTION_VERSION, build_metadata
+
+
+SS58_FORMAT = 2
+TOKEN_DECIMALS = 12
+TOKEN_SYMBOL = 'KSM'
+
+# Blocks of an era, and blocks between the synthetic payout extrinsics
+ERA_BLOCKS = 3600
+PAYOUT_INTERVAL = 100
+
+# Storage functions whose values depend on the block, their generators receive its number
+BLOCK_STORAGE_FUNCTIONS = [('System', 'Events')]
+
+# Bytes of the hash prepended to the storage keys parameters by the concat hashers
+HASHER_SIZES = {'Twox64Concat': 8, 'Blake2_128Concat': 16, 'Identity': 0}
+
+
+#
+# SyntheticChain - State of a synthetic staking chain, generated on demand (and deterministically) from the
+#                  storage keys requested, so it scales to any number of eras, validators and stashes.
+#
+#                  'stashes' validators are the tracked ones, 'validators' is the size of the active set on
+#                  every era, and the window of finished eras is 'eras' long. The tracked validators claimed
+#                  the older half of the window, one page of the eras in the middle and none of the recent.
+#
+class SyntheticChain:
+    def __init__(self, stashes=1, eras=84, validators=1000, nominators=512, page_size=256, seed=0):
+        self.seed = seed
+        self.eras = eras
+        self.nominators = nominators
+        self.page_size = page_size
+
+        self.active_era = 6000
+        self.head = 20_000_000
+
+        self.validators = [account_id(f"validator-{i}") for i in range(validators)]
+        self.stashes = self.validators[:stashes]
+        self.controllers = dict((stash, stash) for stash in self.stashes)
+
+        self.metadata = build_metadata()
+
+        self.runtime_config = RuntimeConfigurationObject(ss58_format=SS58_FORMAT)
+        self.runtime_config.update_type_registry(load_type_registry_preset('core'))
+        metadata = self.runtime_config.create_scale_object('MetadataVersioned', data=ScaleBytes(self.metadata))
+        metadata.decode()
+        self.runtime_config.add_portable_registry(metadata)
+
+        # Storage functions by the prefix of their keys
+        self.storage_functions = {}
+        for pallet in metadata.pallets:
+            if pallet.storage is None:
+                continue
+
+            for storage_function in pallet.storage:
+                prefix = bytes(xxh128(pallet.value['storage']['prefix'].encode()) + xxh128(storage_function.value['name'].encode()))
+                self.storage_functions[prefix] = (
+                    pallet.name, storage_function.value['name'], storage_function.get_param_hashers(),
+                    storage_function.get_params_type_string(), storage_function.get_value_type_string()
+                )
+
+        self.block_hashes = {}
+
+    def block_hash(self, number):
+        block_hash = '0x' + blake2b(f"block-{number}".encode(), digest_size=32).hexdigest()
+        self.block_hashes[block_hash] = number
+        return block_hash
+
+    def header(self, block_hash):
+        number = self.block_hashes.get(block_hash)
+        if number is None:
+            return None
+
+        return {
+            'parentHash': self.block_hash(number - 1) if number > 0 else '0x' + '00' * 32,
+            'number': hex(number),
+            'stateRoot': '0x' + '00' * 32,
+            'extrinsicsRoot': '0x' + '00' * 32,
+            'digest': {'logs': []},
+        }
+
+    def runtime_version(self):
+        return {
+            'specName': 'synthetic',
+            'implName': 'synthetic',
+            'authoringVersion': 1,
+            'specVersion': SPEC_VERSION,
+            'implVersion': 0,
+            'apis': [],
+            'transactionVersion': TRANSACTION_VERSION,
+            'stateVersion': 1,
+        }
+
+    def properties(self):
+        return {'ss58Format': SS58_FORMAT, 'tokenDecimals': TOKEN_DECIMALS, 'tokenSymbol': TOKEN_SYMBOL}
+
+    #
+    # payment_info - Fee and weight of an extrinsic, growing with its size (and so with the calls in a batch).
+    #
+    def payment_info(self, extrinsic):
+        length = (len(extrinsic) - 2) // 2
+        calls = max((length - 110) // 38, 1)
+
+        return {
+            'weight': {'ref_time': 60_000_000_000 * calls, 'proof_size': 30_000 * calls},
+            'class': 'normal',
+            'partialFee': str(150_000_000 + 1_000_000 * length),
+        }
+
+    #
+    # storage - Value of a storage key (hex encoded) at a block, or None when it is not set.
+    #
+    def storage(self, key, block_hash=None):
+        key = bytes.fromhex(key[2:])
+        module, storage_function, hashers, param_types, value_type = self.storage_functions[bytes(key[:32])]
+
+        params = []
+        offset = 32
+        for hasher, param_type in zip(hashers, param_types):
+            offset += HASHER_SIZES[hasher]
+
+            param = self.runtime_config.create_scale_object(param_type, data=ScaleBytes(key[offset:]))
+            params.append(param.decode(check_remaining=False))
+            offset += param.data.offset
+
+        if (module, storage_function) in BLOCK_STORAGE_FUNCTIONS:
+            params.append(self.block_hashes.get(block_hash, self.head))
+
+        value = getattr(self, f"storage_{module}_{storage_function}")(*params)
+        if value is None:
+            return None
+
+        # Values with types scalecodec can only decode are already encoded
+        if isinstance(value, ScaleBytes):
+            return value.to_hex()
+
+        return self.runtime_config.create_scale_object(value_type).encode(value).to_hex()
+
+    def rng(self, *params):
+        return random.Random('-'.join(str(param) for param in (self.seed,) + params))
+
+    def finished(self, era):
+        return self.active_era - self.eras <= era < self.active_era
+
+    def storage_System_Account(self, account):
+        return {
+            'nonce': 0, 'consumers': 0, 'providers': 1, 'sufficients': 0,
+            'data': {'free': 10**18, 'reserved': 0, 'frozen': 0, 'flags': 0},
+        }
+
+    #
+    # storage_System_Events - Every PAYOUT_INTERVAL blocks, a payout of one of the tracked validators for the
+    #                         previous era, paying the validator and two of its nominators.
+    #
+    def storage_System_Events(self, block):
+        if block % PAYOUT_INTERVAL != 0 or len(self.stashes) == 0:
+            return []
+
+        stash = self.stashes[(block // PAYOUT_INTERVAL) % len(self.stashes)]
+        era = self.active_era - (self.head - block) // ERA_BLOCKS - 1
+
+        rng = self.rng('payout', block)
+        rewards = [stash] + [account_id(f"nominator-{stash}-{i}") for i in range(2)]
+
+        events = [self.event_record(1, 'Staking', 'PayoutStarted', {
+            'era_index': era, 'validator_stash': stash, 'page': 0, 'next': None,
+        })]
+        for account in rewards:
+            events.append(self.event_record(1, 'Staking', 'Rewarded', {
+                'stash': account, 'dest': 'Staked', 'amount': rng.randrange(10**9, 10**12),
+            }))
+        events.append(self.event_record(1, 'System', 'ExtrinsicSuccess', {'dispatch_info': {
+            'weight': {'ref_time': 60_000_000_000, 'proof_size': 30_000}, 'class': 'Normal', 'pays_fee': 'Yes',
+        }}))
+
+        return events
+
+    def event_record(self, extrinsic_idx, module, event, attributes):
+        return {'phase': {'ApplyExtrinsic': extrinsic_idx}, 'event': {module: {event: attributes}}, 'topics': []}
+
+    def storage_Staking_HistoryDepth(self):
+        return 84
+
+    def storage_Staking_ActiveEra(self):
+        return {'index': self.active_era, 'start': 1_700_000_000_000}
+
+    def storage_Staking_CurrentEra(self):
+        return self.active_era
+
+    def storage_Staking_Bonded(self, stash):
+        return self.controllers.get(stash)
+
+    def storage_Staking_Ledger(self, controller):
+        if controller not in self.controllers:
+            return None
+
+        return {'stash': controller, 'total': 10**16, 'active': 10**16, 'unlocking': [], 'legacy_claimed_rewards': []}
+
+    def storage_Staking_ErasRewardPoints(self, era):
+        if not self.finished(era):
+            return None
+
+        rng = self.rng('points', era)
+        individual = [(validator, rng.randrange(1000, 100000)) for validator in self.validators]
+
+        # BTreeMap<AccountId, u32> is encoded as a Vec of tuples
+        return (
+            self.runtime_config.create_scale_object('u32').encode(sum(points for validator, points in individual)) +
+            self.runtime_config.create_scale_object('Vec<(AccountId, u32)>').encode(individual)
+        )
+
+    def storage_Staking_ErasValidatorReward(self, era):
+        if not self.finished(era):
+            return None
+
+        return self.rng('reward', era).randrange(10**15, 2 * 10**15)
+
+    def storage_Staking_ErasValidatorPrefs(self, era, stash):
+        return {'commission': self.rng('commission', stash).randrange(0, 10**8), 'blocked': False}
+
+    def storage_Staking_ErasStakersOverview(self, era, stash):
+        if not self.finished(era):
+            return None
+
+        own = self.rng('own', stash).randrange(10**15, 10**16)
+        total = own + sum(self.nominations(era, stash))
+
+        return {
+            'total': total,
+            'own': own,
+            'nominator_count': self.nominators,
+            'page_count': self.page_count(),
+        }
+
+    def storage_Staking_ErasStakersPaged(self, era, stash, page):
+        if not self.finished(era) or page >= self.page_count():
+            return None
+
+        nominations = self.nominations(era, stash)[page * self.page_size:(page + 1) * self.page_size]
+        others = [
+            {'who': account_id(f"nominator-{stash}-{page * self.page_size + i}"), 'value': value}
+            for i, value in enumerate(nominations)
+        ]
+
+        return {'page_total': sum(nominations), 'others': others}
+
+    def storage_Staking_ClaimedRewards(self, era, stash):
+        age = self.active_era - era
+
+        if age > self.eras // 2:
+            return list(range(self.page_count()))
+        if age > self.eras // 4:
+            return [0]
+        return []
+
+    def nominations(self, era, stash):
+        rng = self.rng('nominations', stash)
+        return [rng.randrange(10**12, 10**14) for _ in range(self.nominators)]
+
+    def page_count(self):
+        return max((self.nominators + self.page_size - 1) // self.page_size, 1)
+
+
+#
+# account_id - Address of a synthetic account, derived from its name.
+#
+def account_id(name):
+    return ss58_encode(blake2b(name.encode(), digest_size=32).digest(), SS58_FORMAT)
@@ -0,0 +1,252 @@
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# RPC methods advertised by the node, without state_call, so fees and nonces use their dedicated RPCs
+RPC_METHODS = [
+    'chain_getBlockHash', 'chain_getFinalizedHead', 'chain_getHead', 'chain_getHeader',
+    'payment_queryInfo', 'rpc_methods', 'state_getMetadata', 'state_getRuntimeVersion',
+    'state_getStorage', 'state_queryStorageAt', 'system_accountNextIndex', 'system_properties',
+]
+
+
+#
+# load_fixture - Load the responses of a trace written with --trace-rpc, indexed by method and params.
+#
+def load_fixture(path):
+    fixture = {}
+
+    with open(path) as file:
+        for line in file:
+            if line.strip() == '':
+                continue
+
+            entry = json.loads(line)
+            if 'response' not in entry:
+                continue
+
+            fixture[fixture_key(entry['method'], entry['params'])] = entry['response'].get('result')
+
+    return fixture
+
+
+def fixture_key(method, params):
+    return method, json.dumps(params, sort_keys=True)
+
+
+#
+# MockNode - JSON-RPC node over websockets, serving the requests from a recorded fixture when it has the
+#            response, and from a synthetic chain otherwise. Every response is delayed by 'latency' seconds
+#            and the requests are counted by method.
+#
+class MockNode:
+    def __init__(self, chain, latency=0, fixture=None):
+        self.chain = chain
+        self.latency = latency
+        self.fixture = fixture if fixture is not None else {}
+
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.storage_keys = 0
+
+        self.server = None
+
+    def start(self, address='127.0.0.1', port=0):
+        self.server = MockNodeServer((address, port), MockNodeRequestHandler)
+        self.server.node = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return f"ws://{address}:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.requests = Counter()
+            self.storage_keys = 0
+
+    def handle(self, request):
+        method = request.get('method')
+        params = request.get('params', [])
+
+        with self.lock:
+            self.requests[method] += 1
+            if method == 'state_queryStorageAt':
+                self.storage_keys += len(params[0])
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        key = fixture_key(method, params)
+        if key in self.fixture:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': self.fixture[key]}
+
+        handler = getattr(self, 'rpc_' + method, None)
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': "Method not found"}}
+
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': handler(*params)}
+
+    def rpc_rpc_methods(self):
+        return {'methods': RPC_METHODS}
+
+    def rpc_system_properties(self):
+        return self.chain.properties()
+
+    def rpc_chain_getHead(self):
+        return self.chain.block_hash(self.chain.head)
+
+    def rpc_chain_getFinalizedHead(self):
+        return self.chain.block_hash(self.chain.head)
+
+    def rpc_chain_getBlockHash(self, number=None):
+        if isinstance(number, list):
+            return [self.chain.block_hash(n) for n in number]
+
+        return self.chain.block_hash(number if number is not None else self.chain.head)
+
+    def rpc_chain_getHeader(self, block_hash=None):
+        return self.chain.header(block_hash if block_hash is not None else self.chain.block_hash(self.chain.head))
+
+    def rpc_state_getRuntimeVersion(self, block_hash=None):
+        return self.chain.runtime_version()
+
+    def rpc_state_getMetadata(self, block_hash=None):
+        return self.chain.metadata
+
+    def rpc_state_getStorage(self, key, block_hash=None):
+        return self.chain.storage(key, block_hash)
+
+    def rpc_state_queryStorageAt(self, keys, block_hash=None):
+        return [{
+            'block': block_hash if block_hash is not None else self.chain.block_hash(self.chain.head),
+            'changes': [[key, self.chain.storage(key, block_hash)] for key in keys],
+        }]
+
+    def rpc_payment_queryInfo(self, extrinsic, block_hash=None):
+        return self.chain.payment_info(extrinsic)
+
+    def rpc_system_accountNextIndex(self, account):
+        return 0
+
+
+class MockNodeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+#
+# MockNodeRequestHandler - Websocket connection to the mock node, one JSON-RPC request per text frame.
+#
+class MockNodeRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        if not self.handshake():
+            return
+
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                return
+
+            opcode, payload = frame
+
+            if opcode == OPCODE_CLOSE:
+                self.write_frame(OPCODE_CLOSE, payload[:2])
+                return
+            if opcode == OPCODE_PING:
+                self.write_frame(OPCODE_PONG, payload)
+                continue
+            if opcode != OPCODE_TEXT:
+                continue
+
+            response = self.server.node.handle(json.loads(payload.decode()))
+            self.write_frame(OPCODE_TEXT, json.dumps(response).encode())
+
+    def handshake(self):
+        headers = {}
+
+        self.rfile.readline()
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if line == '':
+                break
+
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'sec-websocket-key' not in headers:
+            return False
+
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest())
+
+        self.wfile.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n" +
+            b"Upgrade: websocket\r\n" +
+            b"Connection: Upgrade\r\n" +
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        self.wfile.flush()
+
+        return True
+
+    def read_frame(self):
+        message = b''
+
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return None
+
+            fin, opcode = header[0] & 0x80, header[0] & 0x0F
+            masked, length = header[1] & 0x80, header[1] & 0x7F
+
+            if length == 126:
+                length = struct.unpack('>H', self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack('>Q', self.rfile.read(8))[0]
+
+            mask = self.rfile.read(4) if masked else None
+            payload = self.rfile.read(length)
+
+            if mask is not None:
+                mask = (mask * (length // 4 + 1))[:length]
+                payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(mask, 'big')).to_bytes(length, 'big')
+
+            # Control frames can be interleaved with the fragments of a message
+            if opcode >= OPCODE_CLOSE:
+                return opcode, payload
+
+            message += payload
+            if opcode != 0:
+                message_opcode = opcode
+
+            if fin:
+                return message_opcode, message
+
+    def write_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 2**16:
+            header += bytes([126]) + struct.pack('>H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('>Q', len(payload))
+
+        self.wfile.write(header + payload)
+        self.wfile.flush()
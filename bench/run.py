@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+#
+# Offline benchmarks of payctl, run against a local mock node (see the Benchmarks section of the README).
+#
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from configparser import ConfigParser
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from substrateinterface import Keypair
+
+from payctl.payctl import cmd_list, plan_payouts
+from payctl.utils import get_active_era, get_eras_payment_info_filtered, get_rpc_pool, get_substrate
+
+from chain import SS58_FORMAT, SyntheticChain
+from mock_node import MockNode, load_fixture
+
+
+SIGNING_URI = '//Alice'
+
+
+#
+# bench_filtered - Payment info of the whole window, as read by all the commands.
+#
+def bench_filtered(args, config):
+    substrate = get_substrate(args, config)
+    pool = get_rpc_pool(args, config, substrate)
+
+    try:
+        block_hash = substrate.get_chain_finalised_head()
+        active_era = get_active_era(substrate, block_hash)
+
+        get_eras_payment_info_filtered(
+            substrate, active_era - int(args.deptheras), active_era,
+            accounts=args.validators,
+            block_hash=block_hash,
+            pool=pool
+        )
+    finally:
+        pool.close()
+
+
+#
+# bench_list - The 'list' subcommand, with its output discarded.
+#
+def bench_list(args, config):
+    with redirect_stdout(io.StringIO()):
+        cmd_list(args, config)
+
+
+#
+# bench_plan - The planning path of the 'pay' subcommand (payouts, batches and fees), without submitting.
+#
+def bench_plan(args, config):
+    substrate = get_substrate(args, config)
+    pool = get_rpc_pool(args, config, substrate)
+
+    try:
+        block_hash = substrate.get_chain_finalised_head()
+        active_era = get_active_era(substrate, block_hash)
+
+        eras_payment_info = get_eras_payment_info_filtered(
+            substrate, active_era - int(args.deptheras), active_era,
+            accounts=args.validators,
+            only_unclaimed=True,
+            block_hash=block_hash,
+            pool=pool
+        )
+    finally:
+        pool.close()
+
+    plan_payouts(args, config, substrate, eras_payment_info, block_hash)
+
+
+TARGETS = {
+    'filtered': bench_filtered,
+    'list': bench_list,
+    'plan': bench_plan,
+}
+
+
+#
+# run_scenario - Run a target against the node, returning the RPC requests by method, the wall time (without
+#                tracemalloc, as it slows everything down) and the peak of memory allocated (with it).
+#
+def run_scenario(node, target, args, config):
+    node.reset()
+    gc.collect()
+
+    started = time.perf_counter()
+    TARGETS[target](args, config)
+    wall_time = time.perf_counter() - started
+
+    requests = dict(node.requests)
+    storage_keys = node.storage_keys
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        TARGETS[target](args, config)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'rpc_requests': sum(requests.values()),
+        'rpc_by_method': requests,
+        'storage_keys': storage_keys,
+        'wall_time': wall_time,
+        'peak_memory': peak_memory,
+    }
+
+
+def get_args(url, chain, eras, concurrency):
+    args = Namespace(
+        command='bench', config=None, rpcurl=url, network='kusama', deptheras=str(eras), cachedir=None,
+        concurrency=str(concurrency), no_cache=True, metricsport=None, profile=False, tracerpc=None,
+        only_unclaimed=False, format='ndjson', validators=list(chain.stashes), mineras='0', batchmode=None,
+        signingaccount=Keypair.create_from_uri(SIGNING_URI, SS58_FORMAT).ss58_address,
+        signingmnemonic=None, signingseed=None, signinguri=SIGNING_URI,
+    )
+
+    config = ConfigParser()
+    config['Defaults'] = {}
+
+    return args, config
+
+
+def format_bytes(size):
+    for unit in ['B', 'KiB', 'MiB']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+
+    return f"{size:.1f}GiB"
+
+
+def format_delta(value, baseline):
+    if baseline is None or baseline == 0:
+        return ""
+
+    return f" ({(value - baseline) / baseline * 100:+.0f}%)"
+
+
+def main():
+    args_parser = ArgumentParser(prog='bench')
+    args_parser.add_argument("-t", "--targets", help="comma separated targets to run", default=','.join(TARGETS.keys()))
+    args_parser.add_argument("-s", "--stashes", help="comma separated numbers of tracked validators", default="1,10,100")
+    args_parser.add_argument("-e", "--eras", help="comma separated depths of the eras window", default="10,84")
+    args_parser.add_argument("-v", "--validators", help="validators in the active set of every era", type=int, default=1000)
+    args_parser.add_argument("--nominators", help="nominators of every validator", type=int, default=512)
+    args_parser.add_argument("-l", "--latency", help="simulated latency of every RPC request, in milliseconds", type=float, default=0)
+    args_parser.add_argument("-j", "--concurrency", help="number of concurrent RPC connections", type=int, default=1)
+    args_parser.add_argument("-f", "--fixture", help="replay the responses of a trace written with --trace-rpc")
+    args_parser.add_argument("-o", "--output", help="write the results to a JSON file, to be used as baseline")
+    args_parser.add_argument("-b", "--baseline", help="compare the results with a previous JSON output")
+
+    args = args_parser.parse_args()
+
+    fixture = load_fixture(args.fixture) if args.fixture is not None else None
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = dict((result['scenario'], result) for result in json.load(file))
+
+    results = []
+
+    print(f"{'scenario':<24} {'rpc':>7} {'keys':>8} {'wall':>20} {'peak memory':>22}")
+
+    for stashes in [int(value) for value in args.stashes.split(',')]:
+        for eras in [int(value) for value in args.eras.split(',')]:
+            chain = SyntheticChain(stashes=stashes, eras=eras, validators=args.validators, nominators=args.nominators)
+            node = MockNode(chain, latency=args.latency / 1000, fixture=fixture)
+            url = node.start()
+
+            try:
+                for target in args.targets.split(','):
+                    scenario = f"{target}/{stashes}x{eras}"
+
+                    result = run_scenario(node, target, *get_args(url, chain, eras, args.concurrency))
+                    result['scenario'] = scenario
+                    results.append(result)
+
+                    previous = baseline.get(scenario, {})
+                    wall = f"{result['wall_time']:.3f}s" + format_delta(result['wall_time'], previous.get('wall_time'))
+                    memory = format_bytes(result['peak_memory']) + format_delta(result['peak_memory'], previous.get('peak_memory'))
+
+                    print(f"{scenario:<24} {result['rpc_requests']:>7} {result['storage_keys']:>8} {wall:>20} {memory:>22}")
+                    sys.stdout.flush()
+            finally:
+                node.stop()
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+from scalecodec.base import RuntimeConfigurationObject
+from scalecodec.type_registry import load_type_registry_preset
+
+
+# Pallet indexes of the synthetic runtime
+PALLETS = {
+    'System': 0,
+    'Balances': 4,
+    'Staking': 7,
+    'Utility': 24,
+}
+
+SPEC_VERSION = 9430
+TRANSACTION_VERSION = 24
+
+
+#
+# PortableRegistryBuilder - Builder of the scale-info types of a synthetic runtime, each type is given the next id.
+#
+class PortableRegistryBuilder:
+    def __init__(self):
+        self.types = []
+        self.primitives = {}
+
+    def add(self, definition, path=None, params=None):
+        type_id = len(self.types)
+
+        self.types.append({
+            'id': type_id,
+            'type': {
+                'path': path or [],
+                'params': [{'name': name, 'type': param} for name, param in (params or [])],
+                'def': definition,
+                'docs': [],
+            }
+        })
+
+        return type_id
+
+    def reserve(self):
+        return self.add({'tuple': []})
+
+    def define(self, type_id, definition, path=None, params=None):
+        self.types[type_id]['type']['def'] = definition
+        self.types[type_id]['type']['path'] = path or []
+        self.types[type_id]['type']['params'] = [{'name': name, 'type': param} for name, param in (params or [])]
+
+        return type_id
+
+    def primitive(self, name):
+        if name not in self.primitives:
+            self.primitives[name] = self.add({'primitive': name})
+        return self.primitives[name]
+
+    def composite(self, fields, path=None, params=None):
+        return self.add({'composite': {'fields': [field(name, ty) for name, ty in fields]}}, path, params)
+
+    def variant(self, variants, path=None, params=None):
+        return self.add({'variant': {'variants': [
+            {'name': name, 'fields': [field(*f) for f in fields], 'index': index, 'docs': []}
+            for index, (name, fields) in enumerate(variants)
+        ]}}, path, params)
+
+    def sequence(self, ty):
+        return self.add({'sequence': {'type': ty}})
+
+    def array(self, length, ty):
+        return self.add({'array': {'len': length, 'type': ty}})
+
+    def tuple(self, types):
+        return self.add({'tuple': types})
+
+    def compact(self, ty):
+        return self.add({'compact': {'type': ty}})
+
+    def option(self, ty):
+        return self.variant([('None', []), ('Some', [(None, ty)])], path=['Option'], params=[('T', ty)])
+
+
+def constant(name, ty, value):
+    return {'name': name, 'type': ty, 'value': value, 'documentation': []}
+
+
+def field(name, ty, type_name=None):
+    return {'name': name, 'type': ty, 'typeName': type_name, 'docs': []}
+
+
+def storage_entry(name, value, keys=None, hashers=None, optional=True, default=None):
+    return {
+        'name': name,
+        'value_type': value,
+        'modifier': 'Optional' if optional else 'Default',
+        'type': {'Plain': value} if keys is None else {'Map': {'hashers': hashers, 'key': keys, 'value': value}},
+        'default': default,
+        'documentation': [],
+    }
+
+
+#
+# build_metadata - Build the SCALE encoded metadata (V14) of a synthetic runtime with the parts of System,
+#                  Balances, Staking (with paged exposures and payout events) and Utility used by payctl.
+#
+def build_metadata():
+    registry = PortableRegistryBuilder()
+
+    u8, u32, u64, u128 = (registry.primitive(name) for name in ['u8', 'u32', 'u64', 'u128'])
+    boolean = registry.primitive('bool')
+    unit = registry.tuple([])
+
+    bytes32 = registry.array(32, u8)
+    account_id = registry.composite([(None, bytes32)], path=['sp_core', 'crypto', 'AccountId32'])
+    h256 = registry.composite([(None, bytes32)], path=['primitive_types', 'H256'])
+    compact_u32 = registry.compact(u32)
+    compact_u64 = registry.compact(u64)
+    compact_u128 = registry.compact(u128)
+    vec_u8 = registry.sequence(u8)
+    vec_u32 = registry.sequence(u32)
+
+    weight = registry.composite(
+        [('ref_time', compact_u64), ('proof_size', compact_u64)], path=['sp_weights', 'weight_v2', 'Weight']
+    )
+    option_weight = registry.option(weight)
+
+    # System
+    account_data = registry.composite(
+        [('free', u128), ('reserved', u128), ('frozen', u128), ('flags', u128)],
+        path=['pallet_balances', 'types', 'AccountData']
+    )
+    account_info = registry.composite(
+        [('nonce', u32), ('consumers', u32), ('providers', u32), ('sufficients', u32), ('data', account_data)],
+        path=['frame_system', 'AccountInfo']
+    )
+    weights_per_class = registry.composite(
+        [('base_extrinsic', weight), ('max_extrinsic', option_weight), ('max_total', option_weight),
+         ('reserved', option_weight)],
+        path=['frame_system', 'limits', 'WeightsPerClass']
+    )
+    per_dispatch_class_weights = registry.composite(
+        [('normal', weights_per_class), ('operational', weights_per_class), ('mandatory', weights_per_class)],
+        path=['frame_support', 'dispatch', 'PerDispatchClass']
+    )
+    block_weights = registry.composite(
+        [('base_block', weight), ('max_block', weight), ('per_class', per_dispatch_class_weights)],
+        path=['frame_system', 'limits', 'BlockWeights']
+    )
+    per_dispatch_class_u32 = registry.composite(
+        [('normal', u32), ('operational', u32), ('mandatory', u32)],
+        path=['frame_support', 'dispatch', 'PerDispatchClass']
+    )
+    block_length = registry.composite([('max', per_dispatch_class_u32)], path=['frame_system', 'limits', 'BlockLength'])
+
+    # Staking
+    perbill = registry.composite([(None, u32)], path=['sp_arithmetic', 'per_things', 'Perbill'])
+    compact_perbill = registry.compact(perbill)
+    active_era_info = registry.composite(
+        [('index', u32), ('start', registry.option(u64))], path=['pallet_staking', 'ActiveEraInfo']
+    )
+    individual_points = registry.sequence(registry.tuple([account_id, u32]))
+    points_map = registry.composite([(None, individual_points)], path=['BTreeMap'], params=[('K', account_id), ('V', u32)])
+    era_reward_points = registry.composite(
+        [('total', u32), ('individual', points_map)], path=['pallet_staking', 'EraRewardPoints']
+    )
+    validator_prefs = registry.composite(
+        [('commission', compact_perbill), ('blocked', boolean)], path=['pallet_staking', 'ValidatorPrefs']
+    )
+    exposure_metadata = registry.composite(
+        [('total', compact_u128), ('own', compact_u128), ('nominator_count', u32), ('page_count', u32)],
+        path=['sp_staking', 'PagedExposureMetadata']
+    )
+    individual_exposure = registry.composite(
+        [('who', account_id), ('value', compact_u128)], path=['sp_staking', 'IndividualExposure']
+    )
+    exposure_page = registry.composite(
+        [('page_total', compact_u128), ('others', registry.sequence(individual_exposure))],
+        path=['sp_staking', 'ExposurePage']
+    )
+    unlock_chunk = registry.composite(
+        [('value', compact_u128), ('era', compact_u32)], path=['pallet_staking', 'UnlockChunk']
+    )
+    staking_ledger = registry.composite(
+        [('stash', account_id), ('total', compact_u128), ('active', compact_u128),
+         ('unlocking', registry.sequence(unlock_chunk)), ('legacy_claimed_rewards', vec_u32)],
+        path=['pallet_staking', 'StakingLedger']
+    )
+
+    # Events
+    reward_destination = registry.variant([
+        ('Staked', []), ('Stash', []), ('Controller', []), ('Account', [(None, account_id)]), ('None', []),
+    ], path=['pallet_staking', 'RewardDestination'])
+    staking_event = registry.variant([
+        ('EraPaid', [('era_index', u32), ('validator_payout', u128), ('remainder', u128)]),
+        ('Rewarded', [('stash', account_id), ('dest', reward_destination), ('amount', u128)]),
+        ('PayoutStarted', [('era_index', u32), ('validator_stash', account_id), ('page', u32), ('next', registry.option(u32))]),
+    ], path=['pallet_staking', 'pallet', 'pallet', 'Event'])
+    system_event = registry.variant([
+        ('ExtrinsicSuccess', [('dispatch_info', registry.composite(
+            [('weight', weight), ('class', registry.variant([('Normal', []), ('Operational', []), ('Mandatory', [])],
+             path=['frame_support', 'dispatch', 'DispatchClass'])), ('pays_fee', registry.variant([('Yes', []), ('No', [])],
+             path=['frame_support', 'dispatch', 'Pays']))],
+            path=['frame_support', 'dispatch', 'DispatchInfo']
+        ))]),
+    ], path=['frame_system', 'pallet', 'Event'])
+    runtime_event = registry.add({'variant': {'variants': [
+        {'name': 'System', 'fields': [field(None, system_event)], 'index': PALLETS['System'], 'docs': []},
+        {'name': 'Staking', 'fields': [field(None, staking_event)], 'index': PALLETS['Staking'], 'docs': []},
+    ]}}, path=['synthetic_runtime', 'RuntimeEvent'])
+    phase = registry.variant(
+        [('ApplyExtrinsic', [(None, u32)]), ('Finalization', []), ('Initialization', [])], path=['frame_system', 'Phase']
+    )
+    event_record = registry.composite(
+        [('phase', phase), ('event', runtime_event), ('topics', registry.sequence(h256))],
+        path=['frame_system', 'EventRecord'], params=[('E', runtime_event), ('T', h256)]
+    )
+
+    # Calls, the runtime call type is recursive through Utility.batch. Their fields carry the type names, as
+    # the call arguments are decoded by them
+    runtime_call = registry.reserve()
+    vec_runtime_call = registry.sequence(runtime_call)
+
+    staking_call = registry.variant([
+        ('payout_stakers', [('validator_stash', account_id, 'T::AccountId'), ('era', u32, 'EraIndex')]),
+        ('payout_stakers_by_page', [
+            ('validator_stash', account_id, 'T::AccountId'), ('era', u32, 'EraIndex'), ('page', u32, 'Page')
+        ]),
+    ], path=['pallet_staking', 'pallet', 'pallet', 'Call'])
+    utility_call = registry.variant([
+        ('batch', [('calls', vec_runtime_call, 'Vec<<T as Config>::RuntimeCall>')]),
+        ('batch_all', [('calls', vec_runtime_call, 'Vec<<T as Config>::RuntimeCall>')]),
+        ('force_batch', [('calls', vec_runtime_call, 'Vec<<T as Config>::RuntimeCall>')]),
+    ], path=['pallet_utility', 'pallet', 'Call'])
+
+    registry.define(runtime_call, {'variant': {'variants': [
+        {'name': 'Staking', 'fields': [field(None, staking_call)], 'index': PALLETS['Staking'], 'docs': []},
+        {'name': 'Utility', 'fields': [field(None, utility_call)], 'index': PALLETS['Utility'], 'docs': []},
+    ]}}, path=['synthetic_runtime', 'RuntimeCall'])
+
+    # Extrinsic
+    multi_address = registry.variant([
+        ('Id', [(None, account_id)]),
+        ('Index', [(None, registry.compact(unit))]),
+        ('Raw', [(None, vec_u8)]),
+        ('Address32', [(None, bytes32)]),
+        ('Address20', [(None, registry.array(20, u8))]),
+    ], path=['sp_runtime', 'multiaddress', 'MultiAddress'], params=[('AccountId', account_id), ('AccountIndex', unit)])
+    multi_signature = registry.variant([
+        ('Ed25519', [(None, registry.array(64, u8))]),
+        ('Sr25519', [(None, registry.array(64, u8))]),
+        ('Ecdsa', [(None, registry.array(65, u8))]),
+    ], path=['sp_runtime', 'MultiSignature'])
+    era = registry.variant(
+        [('Immortal', [])] + [(f"Mortal{i}", [(None, u8)]) for i in range(1, 256)],
+        path=['sp_runtime', 'generic', 'era', 'Era']
+    )
+    extrinsic = registry.composite([(None, vec_u8)], path=['sp_runtime', 'generic', 'unchecked_extrinsic', 'UncheckedExtrinsic'], params=[
+        ('Address', multi_address), ('Call', runtime_call), ('Signature', multi_signature), ('Extra', unit)
+    ])
+
+    signed_extensions = [
+        ('CheckSpecVersion', unit, u32),
+        ('CheckTxVersion', unit, u32),
+        ('CheckGenesis', unit, h256),
+        ('CheckMortality', era, h256),
+        ('CheckNonce', compact_u32, unit),
+        ('CheckWeight', unit, unit),
+        ('ChargeTransactionPayment', compact_u128, unit),
+    ]
+
+    weight_value = lambda ref_time, proof_size: {'ref_time': ref_time, 'proof_size': proof_size}
+    per_class_value = {
+        'base_extrinsic': weight_value(100_000_000, 0),
+        'max_extrinsic': weight_value(1_500_000_000_000, 3_932_160),
+        'max_total': weight_value(1_500_000_000_000, 3_932_160),
+        'reserved': weight_value(0, 0),
+    }
+
+    pallets = [
+        {
+            'name': 'System',
+            'storage': {'prefix': 'System', 'entries': [
+                storage_entry('Account', account_info, account_id, ['Blake2_128Concat'], optional=False, default={
+                    'nonce': 0, 'consumers': 0, 'providers': 0, 'sufficients': 0,
+                    'data': {'free': 0, 'reserved': 0, 'frozen': 0, 'flags': 0},
+                }),
+                storage_entry('Events', registry.sequence(event_record), optional=False, default=[]),
+            ]},
+            'calls': None,
+            'event': {'ty': system_event},
+            'constants': [
+                constant('BlockWeights', block_weights, {
+                    'base_block': weight_value(5_000_000, 0),
+                    'max_block': weight_value(2_000_000_000_000, 5 * 1024 * 1024),
+                    'per_class': {'normal': per_class_value, 'operational': per_class_value, 'mandatory': per_class_value},
+                }),
+                constant('BlockLength', block_length, {'max': {'normal': 3932160, 'operational': 5242880, 'mandatory': 5242880}}),
+                constant('SS58Prefix', registry.primitive('u16'), 2),
+            ],
+            'error': None,
+            'index': PALLETS['System'],
+        },
+        {
+            'name': 'Balances',
+            'storage': None,
+            'calls': None,
+            'event': None,
+            'constants': [
+                constant('ExistentialDeposit', u128, 333_333_333),
+            ],
+            'error': None,
+            'index': PALLETS['Balances'],
+        },
+        {
+            'name': 'Staking',
+            'storage': {'prefix': 'Staking', 'entries': [
+                storage_entry('HistoryDepth', u32, optional=False, default=84),
+                storage_entry('Bonded', account_id, account_id, ['Twox64Concat']),
+                storage_entry('Ledger', staking_ledger, account_id, ['Blake2_128Concat']),
+                storage_entry('ActiveEra', active_era_info),
+                storage_entry('CurrentEra', u32),
+                storage_entry('ErasStakersOverview', exposure_metadata, registry.tuple([u32, account_id]), ['Twox64Concat', 'Twox64Concat']),
+                storage_entry('ErasStakersPaged', exposure_page, registry.tuple([u32, account_id, u32]), ['Twox64Concat', 'Twox64Concat', 'Twox64Concat']),
+                storage_entry('ClaimedRewards', vec_u32, registry.tuple([u32, account_id]), ['Twox64Concat', 'Twox64Concat'], optional=False, default=[]),
+                storage_entry('ErasValidatorPrefs', validator_prefs, registry.tuple([u32, account_id]), ['Twox64Concat', 'Twox64Concat'], optional=False, default={'commission': 0, 'blocked': False}),
+                storage_entry('ErasValidatorReward', u128, u32, ['Twox64Concat']),
+                storage_entry('ErasRewardPoints', era_reward_points, u32, ['Twox64Concat'], optional=False, default={'total': 0, 'individual': []}),
+            ]},
+            'calls': {'ty': staking_call},
+            'event': {'ty': staking_event},
+            'constants': [],
+            'error': None,
+            'index': PALLETS['Staking'],
+        },
+        {
+            'name': 'Utility',
+            'storage': None,
+            'calls': {'ty': utility_call},
+            'event': None,
+            'constants': [],
+            'error': None,
+            'index': PALLETS['Utility'],
+        },
+    ]
+
+    metadata = {
+        'types': {'types': registry.types},
+        'pallets': pallets,
+        'extrinsic': {
+            'ty': extrinsic,
+            'version': 4,
+            'signed_extensions': [
+                {'identifier': name, 'ty': ty, 'additional_signed': additional}
+                for name, ty, additional in signed_extensions
+            ],
+        },
+        'runtime_type': runtime_call,
+    }
+
+    # Constants and defaults are encoded with the types of the registry itself, once it is known
+    runtime_config = RuntimeConfigurationObject()
+    runtime_config.update_type_registry(load_type_registry_preset('core'))
+    runtime_config.add_portable_registry(encode_metadata(runtime_config, metadata, placeholders=True))
+
+    return encode_metadata(runtime_config, metadata).data.to_hex()
+
+
+#
+# encode_metadata - Encode the metadata, with the values of constants and storage defaults encoded with their
+#                   types (or left empty, when the registry types are not known yet).
+#
+def encode_metadata(runtime_config, metadata, placeholders=False):
+    def encode(type_id, value):
+        if placeholders:
+            return '0x'
+        return runtime_config.create_scale_object(f"scale_info::{type_id}").encode(value).to_hex()
+
+    pallets = []
+    for pallet in metadata['pallets']:
+        pallet = dict(pallet)
+
+        pallet['constants'] = [
+            dict(constant, value=encode(constant['type'], constant['value'])) for constant in pallet['constants']
+        ]
+
+        if pallet['storage'] is not None:
+            pallet['storage'] = dict(pallet['storage'], entries=[
+                # Optional entries default to None
+                dict(entry, default=encode(entry['value_type'], entry['default']) if entry['default'] is not None else '0x00')
+                for entry in pallet['storage']['entries']
+            ])
+            for entry in pallet['storage']['entries']:
+                del entry['value_type']
+
+        pallets.append(pallet)
+
+    data = runtime_config.create_scale_object('MetadataVersioned').encode(
+        ['0x6d657461', {'V14': dict(metadata, pallets=pallets)}]
+    )
+
+    decoded = runtime_config.create_scale_object('MetadataVersioned', data=data)
+    decoded.decode()
+
+    return decoded
@@ -1 +1,2 @@
-from .payctl import main
\ No newline at end of file
+from .client import PayctlClient
+from .payctl import main
@@ -0,0 +1,315 @@
+import os
+import sqlite3
+import sys
+import threading
+
+from .pool import run_concurrently
+from .profiling import profiled
+
+
+# Blocks scanned by each job of the pool, and recorded at once on the index
+AUDIT_RANGE_SIZE = 1000
+
+
+#
+# AuditIndex - On-disk index (SQLite) of the staking payout events found on an archive scan, keyed by network
+#              and genesis hash, along with the block ranges already scanned for each stash.
+#
+#              Every range is recorded with its events in a single transaction once it is fully scanned, so
+#              an interrupted scan resumes from the ranges left, and re-runs only scan the new blocks.
+#
+class AuditIndex:
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS scanned_ranges (
+            network TEXT NOT NULL,
+            genesis TEXT NOT NULL,
+            stash TEXT NOT NULL,
+            from_block INTEGER NOT NULL,
+            to_block INTEGER NOT NULL,
+            PRIMARY KEY (network, genesis, stash, from_block, to_block)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS payout_events (
+            network TEXT NOT NULL,
+            genesis TEXT NOT NULL,
+            block INTEGER NOT NULL,
+            event_index INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            era INTEGER,
+            validator TEXT,
+            page INTEGER,
+            stash TEXT NOT NULL,
+            amount TEXT,
+            PRIMARY KEY (network, genesis, block, event_index)
+        )
+        """,
+    ]
+
+    def __init__(self, path, network, genesis_hash):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.network = network
+        self.genesis_hash = genesis_hash
+
+        # The index is written from the RPC pool threads
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        for statement in self.SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    #
+    # get_scanned_ranges - Get the (merged) block ranges already scanned for each of the stashes,
+    #                      as {stash: [(from_block, to_block)]}.
+    #
+    def get_scanned_ranges(self, stashes):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT stash, from_block, to_block FROM scanned_ranges " +
+                "WHERE network = ? AND genesis = ? ORDER BY stash, from_block",
+                (self.network, self.genesis_hash)
+            ).fetchall()
+
+        ranges = dict((stash, []) for stash in stashes)
+        for stash, from_block, to_block in rows:
+            if stash not in ranges:
+                continue
+
+            if len(ranges[stash]) > 0 and from_block <= ranges[stash][-1][1] + 1:
+                ranges[stash][-1] = (ranges[stash][-1][0], max(ranges[stash][-1][1], to_block))
+            else:
+                ranges[stash].append((from_block, to_block))
+
+        return ranges
+
+    #
+    # add_range - Record the events found on a block range, and the range as scanned for the given stashes.
+    #
+    def add_range(self, stashes, from_block, to_block, events):
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO payout_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.network, self.genesis_hash, event['block'], event['event_index'], event['event'],
+                        event['era'], event['validator'], event['page'], event['stash'],
+                        str(event['amount']) if event['amount'] is not None else None
+                    )
+                    for event in events
+                ]
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO scanned_ranges VALUES (?, ?, ?, ?, ?)",
+                [(self.network, self.genesis_hash, stash, from_block, to_block) for stash in stashes]
+            )
+            self.db.commit()
+
+    #
+    # get_events - Get the payout events of the given stashes found between two blocks, oldest first.
+    #
+    def get_events(self, stashes, from_block, to_block):
+        stashes = set(stashes)
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT block, event_index, event, era, validator, page, stash, amount FROM payout_events " +
+                "WHERE network = ? AND genesis = ? AND block BETWEEN ? AND ? ORDER BY block, event_index",
+                (self.network, self.genesis_hash, from_block, to_block)
+            ).fetchall()
+
+        return [
+            {
+                'block': block,
+                'event_index': event_index,
+                'event': event,
+                'era': era,
+                'validator': validator,
+                'page': page,
+                'stash': stash,
+                'amount': int(amount) if amount is not None else None,
+            }
+            for block, event_index, event, era, validator, page, stash, amount in rows if stash in stashes
+        ]
+
+    def close(self):
+        self.db.close()
+
+
+#
+# get_pending_ranges - Split the blocks between 'from_block' and 'to_block' in aligned ranges of AUDIT_RANGE_SIZE
+#                      blocks, keeping the ones not scanned yet for some of the stashes. Returns a list of
+#                      (from_block, to_block, stashes) with the stashes each range has to be scanned for.
+#
+def get_pending_ranges(scanned_ranges, from_block, to_block):
+    pending_ranges = []
+
+    start = from_block
+    while start <= to_block:
+        end = min((start // AUDIT_RANGE_SIZE + 1) * AUDIT_RANGE_SIZE - 1, to_block)
+
+        stashes = [
+            stash for stash, ranges in scanned_ranges.items()
+            if not any(scanned_from <= start and end <= scanned_to for scanned_from, scanned_to in ranges)
+        ]
+        if len(stashes) > 0:
+            pending_ranges.append((start, end, stashes))
+
+        start = end + 1
+
+    return pending_ranges
+
+
+#
+# scan_range - Scan the events of a block range looking for the payouts of the given stashes.
+#
+#              The block hashes of the range are fetched with a single request, and the runtime is only
+#              loaded once for the whole range, unless there was a runtime upgrade in the middle of it,
+#              in which case the range is split until each part was produced by a single runtime.
+#
+@profiled
+def scan_range(substrate, from_block, to_block, stashes):
+    numbers = list(range(max(from_block - 1, 0), to_block + 1))
+    block_hashes = dict(zip(numbers, substrate.rpc_request('chain_getBlockHash', [numbers])['result']))
+
+    return scan_blocks(substrate, block_hashes, from_block, to_block, set(stashes))
+
+
+def scan_blocks(substrate, block_hashes, from_block, to_block, stashes):
+    from scalecodec.base import ScaleBytes
+    from substrateinterface.storage import StorageKey
+
+    # The events of a block are decoded with the runtime of its parent
+    parent_version = get_spec_version(substrate, block_hashes[max(from_block - 1, 0)])
+    last_version = get_spec_version(substrate, block_hashes[max(to_block - 1, 0)])
+
+    if parent_version != last_version and to_block > from_block:
+        middle = (from_block + to_block) // 2
+        return (
+            scan_blocks(substrate, block_hashes, from_block, middle, stashes) +
+            scan_blocks(substrate, block_hashes, middle + 1, to_block, stashes)
+        )
+
+    substrate.init_runtime(block_hash=block_hashes[to_block])
+
+    storage_key = StorageKey.create_from_storage_function(
+        'System', 'Events', [],
+        runtime_config=substrate.runtime_config,
+        metadata=substrate.metadata
+    )
+
+    events = []
+    for block in range(from_block, to_block + 1):
+        result = substrate.rpc_request('state_getStorage', [storage_key.to_hex(), block_hashes[block]])['result']
+        if result is None:
+            continue
+
+        events += get_payout_events(block, storage_key.decode_scale_value(ScaleBytes(result)).value, stashes)
+
+    return events
+
+
+def get_spec_version(substrate, block_hash):
+    return substrate.rpc_request('state_getRuntimeVersion', [block_hash])['result']['specVersion']
+
+
+#
+# get_payout_events - Get the payout events of the given stashes from the events of a block.
+#
+#                     Rewarded events carry no era, they are matched with the last PayoutStarted event of
+#                     the same extrinsic, as the rewards of a payout are deposited right after it starts.
+#
+def get_payout_events(block, event_records, stashes):
+    payouts = {}
+    events = []
+
+    for event_index, event_record in enumerate(event_records):
+        if event_record['module_id'] != 'Staking':
+            continue
+
+        extrinsic_idx = event_record['extrinsic_idx']
+        attributes = event_record['attributes']
+
+        if event_record['event_id'] == 'PayoutStarted':
+            payout = {
+                'era': event_attribute(attributes, 'era_index', 0),
+                'validator': event_attribute(attributes, 'validator_stash', 1),
+                'page': event_attribute(attributes, 'page', 2),
+            }
+            payouts[extrinsic_idx] = payout
+
+            if payout['validator'] in stashes:
+                events.append(dict(
+                    payout, block=block, event_index=event_index, event='PayoutStarted',
+                    stash=payout['validator'], amount=None
+                ))
+        elif event_record['event_id'] == 'Rewarded':
+            stash = event_attribute(attributes, 'stash', 0)
+            if stash not in stashes:
+                continue
+
+            payout = payouts.get(extrinsic_idx, {'era': None, 'validator': None, 'page': None})
+
+            # The reward destination was added as the second field of the event
+            amount = event_attribute(attributes, 'amount', 2 if len(attributes) > 2 else 1)
+
+            events.append(dict(
+                payout, block=block, event_index=event_index, event='Rewarded', stash=stash, amount=int(amount)
+            ))
+
+    return events
+
+
+#
+# event_attribute - Get an event attribute by name, or by position on events with unnamed fields.
+#
+def event_attribute(attributes, name, position):
+    if isinstance(attributes, dict):
+        return attributes.get(name)
+
+    if position >= len(attributes):
+        return None
+
+    attribute = attributes[position]
+
+    # Events of runtimes before metadata V14 are decoded with the type of each attribute
+    if isinstance(attribute, dict) and 'value' in attribute and 'type' in attribute:
+        return attribute['value']
+
+    return attribute
+
+
+#
+# audit_payouts - Scan the blocks between 'from_block' and 'to_block' for the payouts of the given stashes,
+#                 skipping the ranges already on the index. Ranges are scanned concurrently on the pool,
+#                 and recorded on the index as they finish.
+#
+def audit_payouts(substrate, index, stashes, from_block, to_block, pool=None):
+    pending_ranges = get_pending_ranges(index.get_scanned_ranges(stashes), from_block, to_block)
+    if len(pending_ranges) == 0:
+        return
+
+    print(
+        f"Scanning {sum(end - start + 1 for start, end, _ in pending_ranges)} blocks " +
+        f"in {len(pending_ranges)} range(s)",
+        file=sys.stderr
+    )
+
+    progress = {'done': 0}
+    progress_lock = threading.Lock()
+
+    def scan(substrate, pending_range):
+        start, end, range_stashes = pending_range
+
+        index.add_range(range_stashes, start, end, scan_range(substrate, start, end, range_stashes))
+
+        with progress_lock:
+            progress['done'] += 1
+            print(f"Scanned blocks {start}-{end} ({progress['done']}/{len(pending_ranges)})", file=sys.stderr)
+
+    run_concurrently(substrate, pool, [
+        lambda substrate, pending_range=pending_range: scan(substrate, pending_range) for pending_range in pending_ranges
+    ])
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+
+#
+# EraCache - On-disk cache (SQLite) of finalized era data, keyed by network, genesis hash and era.
+#
+#            Rewards and exposure page counts of finished eras (ErasRewardPoints, ErasValidatorReward
+#            and ErasStakersOverview) never change, and claimed pages only get added, so all of them
+#            can be kept across runs and only the missing pieces need to be fetched from the chain.
+#
+class EraCache:
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS eras (
+            network TEXT NOT NULL,
+            genesis TEXT NOT NULL,
+            era INTEGER NOT NULL,
+            total_points INTEGER NOT NULL,
+            total_reward TEXT NOT NULL,
+            individual BLOB NOT NULL,
+            PRIMARY KEY (network, genesis, era)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS claimed_pages (
+            network TEXT NOT NULL,
+            genesis TEXT NOT NULL,
+            era INTEGER NOT NULL,
+            stash TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            PRIMARY KEY (network, genesis, era, stash, page)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS page_counts (
+            network TEXT NOT NULL,
+            genesis TEXT NOT NULL,
+            era INTEGER NOT NULL,
+            stash TEXT NOT NULL,
+            page_count INTEGER NOT NULL,
+            PRIMARY KEY (network, genesis, era, stash)
+        )
+        """,
+    ]
+
+    def __init__(self, path, network, genesis_hash):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.network = network
+        self.genesis_hash = genesis_hash
+
+        # The cache may be used from the RPC pool threads
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        for statement in self.SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    #
+    # get_eras - Get the cached rewards for the given eras, as {era: {'total', 'individual', 'reward'}}.
+    #
+    def get_eras(self, eras):
+        eras = set(eras)
+        if len(eras) == 0:
+            return {}
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT era, total_points, total_reward, individual FROM eras " +
+                "WHERE network = ? AND genesis = ? AND era BETWEEN ? AND ?",
+                (self.network, self.genesis_hash, min(eras), max(eras))
+            ).fetchall()
+
+        cached_eras = {}
+        for era, total_points, total_reward, individual in rows:
+            if era not in eras:
+                continue
+
+            cached_eras[era] = {
+                'total': total_points,
+                'individual': dict(json.loads(zlib.decompress(individual))),
+                'reward': int(total_reward),
+            }
+
+        return cached_eras
+
+    #
+    # set_era - Store the rewards of a finished era.
+    #
+    def set_era(self, era, total_points, individual, total_reward):
+        individual = zlib.compress(json.dumps(list(individual.items()), separators=(',', ':')).encode())
+
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO eras VALUES (?, ?, ?, ?, ?, ?)",
+                (self.network, self.genesis_hash, era, total_points, str(total_reward), individual)
+            )
+            self.db.commit()
+
+    #
+    # get_claims - Get the cached claimed pages for the given eras, as {(era, stash): set(page)}.
+    #
+    def get_claims(self, eras):
+        eras = set(eras)
+        if len(eras) == 0:
+            return {}
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT era, stash, page FROM claimed_pages " +
+                "WHERE network = ? AND genesis = ? AND era BETWEEN ? AND ?",
+                (self.network, self.genesis_hash, min(eras), max(eras))
+            ).fetchall()
+
+        claims = {}
+        for era, stash, page in rows:
+            if era in eras:
+                claims.setdefault((era, stash), set()).add(page)
+
+        return claims
+
+    #
+    # add_claims - Record the given pages as claimed, from a {(era, stash): set(page)} dict.
+    #
+    def add_claims(self, claims):
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO claimed_pages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.network, self.genesis_hash, era, stash, page)
+                    for (era, stash), pages in claims.items() for page in pages
+                ]
+            )
+            self.db.commit()
+
+    #
+    # get_page_counts - Get the cached exposure page counts for the given eras, as {(era, stash): page_count}.
+    #
+    def get_page_counts(self, eras):
+        eras = set(eras)
+        if len(eras) == 0:
+            return {}
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT era, stash, page_count FROM page_counts " +
+                "WHERE network = ? AND genesis = ? AND era BETWEEN ? AND ?",
+                (self.network, self.genesis_hash, min(eras), max(eras))
+            ).fetchall()
+
+        return dict(((era, stash), page_count) for era, stash, page_count in rows if era in eras)
+
+    #
+    # set_page_counts - Store the exposure page counts from a {(era, stash): page_count} dict.
+    #
+    def set_page_counts(self, page_counts):
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO page_counts VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.network, self.genesis_hash, era, stash, page_count)
+                    for (era, stash), page_count in page_counts.items()
+                ]
+            )
+            self.db.commit()
+
+    #
+    # prune - Remove the eras older than the given one, which are out of the history depth.
+    #
+    def prune(self, start):
+        with self.lock:
+            for table in ('eras', 'claimed_pages', 'page_counts'):
+                self.db.execute(
+                    f"DELETE FROM {table} WHERE network = ? AND genesis = ? AND era < ?",
+                    (self.network, self.genesis_hash, start)
+                )
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,189 @@
+import os
+import threading
+
+from .cache import EraCache
+from .pool import RPCPool
+from .rewards import get_eras_rewards_breakdown
+from .schedule import get_eras_left
+from .utils import (
+    DEFAULT_DEPTH_ERAS, connect_substrate, get_active_era, get_constants_index, get_current_era,
+    get_eras_payment_info_filtered, get_history_depth
+)
+
+
+#
+# PayctlClient - Library interface to payctl, for long-running processes querying the rewards of validators.
+#
+#                The client owns a persistent connection (plus the pool of 'concurrency' connections used to run
+#                the requests concurrently), the runtime metadata and constants, and an era cache, so repeated
+#                queries only fetch what changed since the previous one. The era cache is kept in memory unless
+#                a 'cache_dir' is given, in which case it is shared with the command-line runs.
+#
+#                Results are returned as values instead of printed: payouts are EraPayout records (amounts in
+#                integer planck) generated era by era.
+#
+#                A client can be shared by several threads, calls are serialized on its connection. From
+#                asyncio, run the calls in an executor (loop.run_in_executor), as they block. When a call
+#                fails the connections are closed, and opened again by the next call.
+#
+#                    client = PayctlClient('wss://kusama-rpc.polkadot.io/', 'kusama')
+#                    for payout in client.iter_payouts(['GetZUSLF...'], only_unclaimed=True):
+#                        print(payout.era, payout.stash, payout.amount, payout.status)
+#                    client.close()
+#
+class PayctlClient:
+    def __init__(self, url, network, cache_dir=None, concurrency=1, depth=DEFAULT_DEPTH_ERAS):
+        # Several URLs can be given separated by commas, the pool connections are spread among them
+        self.urls = [u.strip() for u in url.split(',') if u.strip() != '']
+        self.network = network
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir is not None else None
+        self.concurrency = concurrency
+        self.depth = depth
+
+        self.lock = threading.RLock()
+
+        self.substrate = None
+        self.pool = None
+        self.cache = None
+
+        # Metadata constants, indexed by the runtime version they were read from
+        self.constants = None
+        self.constants_version = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #
+    # close - Close the connections and the era cache. The client can still be used, it connects again.
+    #
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+            if self.substrate is not None:
+                self.substrate.close()
+            if self.cache is not None:
+                self.cache.close()
+
+            self.substrate = None
+            self.pool = None
+            self.cache = None
+
+    #
+    # get_active_era - Get the index of the active era.
+    #
+    def get_active_era(self):
+        return self._run(lambda substrate: get_active_era(substrate, substrate.get_chain_finalised_head()))
+
+    #
+    # get_history_depth - Get the number of eras the rewards can be claimed for.
+    #
+    def get_history_depth(self):
+        return self._run(lambda substrate: get_history_depth(substrate, self._get_constants(substrate)))
+
+    #
+    # get_eras_left - Get the number of eras left to claim the rewards of an era, before it is pruned.
+    #
+    def get_eras_left(self, era):
+        def eras_left(substrate):
+            block_hash = substrate.get_chain_finalised_head()
+            history_depth = get_history_depth(substrate, self._get_constants(substrate), block_hash)
+
+            return get_eras_left(era, get_current_era(substrate, block_hash), history_depth)
+
+        return self._run(eras_left)
+
+    #
+    # iter_payouts - Generate the payouts (EraPayout) of the given validators on the last 'depth' eras (the depth
+    #                of the client by default), newest era first. All of them are read at the same block.
+    #
+    def iter_payouts(self, accounts, depth=None, only_unclaimed=False):
+        def payouts(substrate):
+            start, end, block_hash = self._get_window(substrate, depth)
+
+            return get_eras_payment_info_filtered(
+                substrate, start, end,
+                accounts=list(accounts),
+                only_unclaimed=only_unclaimed,
+                block_hash=block_hash,
+                cache=self.cache,
+                pool=self.pool
+            )
+
+        eras_payment_info = self._run(payouts)
+
+        # The lock is not held while the caller consumes the payouts
+        for era in sorted(eras_payment_info.keys(), reverse=True):
+            for payout in eras_payment_info[era].values():
+                yield payout
+
+    #
+    # get_rewards_breakdown - Get how the rewards of the given validators on the last 'depth' eras are split, see
+    #                         get_eras_rewards_breakdown. It requires numpy.
+    #
+    def get_rewards_breakdown(self, accounts, depth=None):
+        def breakdown(substrate):
+            start, end, block_hash = self._get_window(substrate, depth)
+
+            return get_eras_rewards_breakdown(
+                substrate, start, end, list(accounts), block_hash=block_hash, cache=self.cache, pool=self.pool
+            )
+
+        return self._run(breakdown)
+
+    #
+    # _run - Run a function with the connection, serialized with the other calls. Connections are opened on the
+    #        first call, and closed when a call fails, as they may be broken.
+    #
+    def _run(self, fn):
+        with self.lock:
+            try:
+                return fn(self._connect())
+            except Exception:
+                self.close()
+                raise
+
+    def _connect(self):
+        if self.substrate is None:
+            self.substrate = connect_substrate(self.urls[0], self.network, cache_dir=self.cache_dir)
+            self.pool = RPCPool(
+                self.urls,
+                lambda url: connect_substrate(url, self.network, cache_dir=self.cache_dir),
+                size=self.concurrency,
+                substrate=self.substrate
+            )
+            self.cache = EraCache(
+                os.path.join(self.cache_dir, 'eras.sqlite') if self.cache_dir is not None else ':memory:',
+                self.network,
+                self.substrate.genesis_hash
+            )
+
+        return self.substrate
+
+    def _get_constants(self, substrate):
+        substrate.init_runtime()
+
+        if self.constants is None or self.constants_version != substrate.runtime_version:
+            self.constants = get_constants_index(substrate)
+            self.constants_version = substrate.runtime_version
+
+        return self.constants
+
+    #
+    # _get_window - Get the eras window (start, end) of the given depth as of the finalized head, and the head.
+    #
+    def _get_window(self, substrate, depth):
+        block_hash = substrate.get_chain_finalised_head()
+        active_era = get_active_era(substrate, block_hash)
+
+        depth = depth if depth is not None else self.depth
+
+        # Calls with a shorter depth do not prune the eras of the client depth
+        self.cache.prune(active_era - max(depth, self.depth))
+
+        start = active_era - depth
+
+        return start, active_era, block_hash
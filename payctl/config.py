@@ -0,0 +1,144 @@
+import re
+
+from .ss58 import get_format_info, ss58_decode
+from .utils import get_config, get_config_lines, get_rpc_urls, get_ss58_address_format
+
+
+# Options that must be positive integers when set, by key and name
+INTEGER_OPTIONS = {
+    'deptheras': 'DepthEras',
+    'mineras': 'MinEras',
+    'expiryeras': 'ExpiryEras',
+    'concurrency': 'Concurrency',
+    'metricsport': 'MetricsPort',
+    'metricsinterval': 'MetricsInterval',
+}
+
+BATCH_MODES = ['batch', 'batch_all', 'force_batch', 'none']
+
+RPC_URL_SCHEMES = ['ws://', 'wss://', 'http://', 'https://']
+
+# Words of the BIP39 mnemonics
+MNEMONIC_LENGTHS = [12, 15, 18, 21, 24]
+
+
+#
+# check_config - Validate a config offline (with the options given on the command-line applied), returning the
+#                list of problems found. Nothing is requested to the chain, and the keys are not derived, so
+#                it is cheap enough to run as a health check.
+#
+def check_config(args, config):
+    problems = []
+
+    if 'Defaults' not in config:
+        return ["missing [Defaults] section"]
+
+    rpc_url = get_config(args, config, 'rpcurl')
+    if rpc_url is None or len(get_rpc_urls(args, config)) == 0:
+        problems.append("missing RPCURL")
+    else:
+        for url in get_rpc_urls(args, config):
+            if not any(url.startswith(scheme) for scheme in RPC_URL_SCHEMES):
+                problems.append(f"invalid RPCURL '{url}', expected a ws(s):// or http(s):// URL")
+
+    network = get_config(args, config, 'network')
+    if network is None:
+        problems.append("missing Network")
+
+    ss58_format = get_ss58_address_format(network) if network is not None else None
+
+    for key, name in INTEGER_OPTIONS.items():
+        value = get_config(args, config, key)
+        if value is not None and not (value.isdigit() and int(value) > 0):
+            problems.append(f"invalid {name} '{value}', expected a positive integer")
+
+    batch_mode = get_config(args, config, 'batchmode')
+    if batch_mode is not None and batch_mode not in BATCH_MODES:
+        problems.append(f"invalid BatchMode '{batch_mode}', expected one of {', '.join(BATCH_MODES)}")
+
+    for section in config.sections():
+        if section == 'Defaults':
+            continue
+
+        problem = check_address(section, ss58_format)
+        if problem is not None:
+            problems.append(f"invalid validator [{section}]: {problem}")
+
+    problems += check_signing(args, config, ss58_format)
+
+    return problems
+
+
+#
+# check_signing - Validate the signing account and key material. Both are optional, but one is useless without
+#                 the other, and only one kind of key material can be given. Several keys (signing lanes) can be
+#                 given one per line, their accounts are the ones of the keys then.
+#
+def check_signing(args, config, ss58_format):
+    problems = []
+
+    signing_account = get_config(args, config, 'signingaccount')
+    keys = dict(
+        (key, get_config(args, config, key)) for key in ['signingseed', 'signingmnemonic', 'signinguri']
+        if get_config(args, config, key) not in [None, '']
+    )
+
+    if signing_account in [None, ''] and len(keys) == 0:
+        return problems
+
+    lanes = max([len(get_config_lines(value)) for value in keys.values()] + [1])
+
+    if signing_account in [None, '']:
+        if lanes == 1:
+            problems.append("missing SigningAccount, required along with the signing key")
+    else:
+        problem = check_address(signing_account, ss58_format)
+        if problem is not None:
+            problems.append(f"invalid SigningAccount: {problem}")
+
+    if len(keys) == 0:
+        problems.append("missing signing key, one of SigningMnemonic, SigningSeed or SigningUri is required")
+    elif len(keys) > 1:
+        problems.append(f"several signing keys given ({', '.join(sorted(keys))}), only one is used")
+
+    if 'signingseed' in keys and not all(is_seed(seed) for seed in get_config_lines(keys['signingseed'])):
+        problems.append("invalid SigningSeed, expected 32 bytes in hex")
+
+    if 'signingmnemonic' in keys and not all(is_mnemonic(mnemonic) for mnemonic in get_config_lines(keys['signingmnemonic'])):
+        problems.append(f"invalid SigningMnemonic, expected {', '.join(map(str, MNEMONIC_LENGTHS))} words")
+
+    # URIs are a phrase (mnemonic or seed, the development one if empty) followed by the derivation path
+    if 'signinguri' in keys:
+        phrases = [uri.split('/', 1)[0] for uri in get_config_lines(keys['signinguri'])]
+        if not all(phrase == '' or is_mnemonic(phrase) or is_seed(phrase) for phrase in phrases):
+            problems.append("invalid SigningUri, expected a mnemonic or seed followed by the derivation path")
+
+    return problems
+
+
+#
+# check_address - Check an SS58 address is valid and belongs to the network, returning the problem found, if any.
+#                 The format is not checked for networks not on the registry, it is only known by the chain.
+#
+def check_address(address, ss58_format):
+    try:
+        address_format, _ = ss58_decode(address)
+    except ValueError as exc:
+        return str(exc)
+
+    if ss58_format is not None and address_format != ss58_format:
+        format_info = get_format_info(address_format)
+        network = f" ({format_info['display_name']})" if format_info is not None else ""
+
+        return f"address format {address_format}{network} does not match the network format {ss58_format}"
+
+    return None
+
+
+def is_seed(value):
+    return re.fullmatch(r'(0x)?[0-9a-fA-F]{64}', value.strip()) is not None
+
+
+def is_mnemonic(value):
+    words = value.split()
+    return len(words) in MNEMONIC_LENGTHS and all(word.isalpha() and word.islower() for word in words)
@@ -0,0 +1,105 @@
+import contextvars
+import io
+import queue
+import sys
+import threading
+
+
+#
+# ThreadOutput - Replacement of sys.stdout that keeps the output of each thread apart.
+#
+#                Threads that started a capture write to their own buffer, which is either returned when
+#                they finish (grouped output), or streamed line by line with a prefix (for long-running
+#                commands). Any other thread writes straight to the original stream.
+#
+#                The capture is kept on a context variable, so the jobs run on the RPC pool workers started
+#                by a captured thread (which run on a copy of its context) write to its buffer too.
+#
+class ThreadOutput:
+    def __init__(self, stream):
+        self.stream = stream
+        self.current = contextvars.ContextVar('output_capture', default=None)
+        self.lock = threading.Lock()
+
+    def capture(self, prefix=None):
+        self.current.set({'buffer': io.StringIO(), 'prefix': prefix})
+
+    def release(self):
+        capture = self.current.get()
+        self.current.set(None)
+
+        if capture is None:
+            return ''
+
+        with self.lock:
+            return capture['buffer'].getvalue()
+
+    def write(self, data):
+        capture = self.current.get()
+
+        with self.lock:
+            if capture is None:
+                return self.stream.write(data)
+
+            buffer = capture['buffer']
+            buffer.write(data)
+
+            if capture['prefix'] is not None and '\n' in data:
+                lines = buffer.getvalue().split('\n')
+
+                for line in lines[:-1]:
+                    self.stream.write(f"{capture['prefix']}{line}\n")
+                self.stream.flush()
+
+                capture['buffer'] = io.StringIO(lines[-1])
+                capture['buffer'].seek(0, io.SEEK_END)
+
+        return len(data)
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+
+#
+# run_fanout - Run a command handler for several configs concurrently, each one on its own thread (and so
+#              with its own connection). The output of each config is printed under a header as soon as it
+#              finishes, or prefixed line by line when streamed. Returns the number of failed configs, the
+#              ones raising an error or returning a non-zero exit status.
+#
+#              Signals are only delivered to the main thread, so the configs run on daemon threads: on Ctrl-C
+#              the main thread stops waiting and the process exits with them, as long-running commands
+#              (watch, serve-metrics) never finish on their own.
+#
+def run_fanout(handler, args, configs, stream=False):
+    output = ThreadOutput(sys.stdout)
+    results = queue.Queue()
+
+    def run(name, config):
+        output.capture(prefix=f"[{name}] " if stream else None)
+
+        try:
+            results.put(not handler(args, config))
+        except Exception as exc:
+            print(f"Error: {str(exc)}")
+            results.put(False)
+        finally:
+            text = output.release()
+
+            with output.lock:
+                if not stream:
+                    output.stream.write(f"==> {name} <==\n{text}\n")
+                elif text != '':
+                    output.stream.write(f"[{name}] {text}\n")
+                output.stream.flush()
+
+    sys.stdout = output
+    try:
+        for name, config in configs:
+            threading.Thread(target=run, args=(name, config), name=f"fanout-{name}", daemon=True).start()
+
+        return sum(0 if results.get() else 1 for _ in configs)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        sys.stdout = output.stream
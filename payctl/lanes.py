@@ -0,0 +1,61 @@
+from .pool import run_concurrently
+
+
+#
+# assign_lanes - Assign the extrinsics (sorted by urgency) to the signing lanes (sessions), spreading them evenly
+#                among the lanes whose projected balance can still pay their fee and keep the existential
+#                deposit. Returns the lane index of each extrinsic, None for the ones no lane can pay.
+#
+def assign_lanes(sessions, expected_fees):
+    balances = [session.free_balance for session in sessions]
+    counts = [0] * len(sessions)
+
+    assignment = []
+    for expected_fee in expected_fees:
+        lanes = [
+            lane for lane, session in enumerate(sessions)
+            if balances[lane] - expected_fee >= session.existential_deposit
+        ]
+
+        if len(lanes) == 0:
+            assignment.append(None)
+            continue
+
+        lane = min(lanes, key=lambda lane: counts[lane])
+        balances[lane] -= expected_fee
+        counts[lane] += 1
+
+        assignment.append(lane)
+
+    return assignment
+
+
+#
+# submit_lanes - Sign the extrinsics with the session of their lane and submit them, the lanes concurrently (each
+#                one on its own connection of the pool, if any) and the extrinsics of a lane in nonce order.
+#
+#                Signing uses the metadata of the main connection, so it is done upfront and only the submissions
+#                run concurrently. A lane stops on its first submission error, as the extrinsics after it would
+#                wait for the missing nonce forever, and it is flagged as failed. Returns the hash of each
+#                extrinsic, None for the ones not submitted.
+#
+def submit_lanes(substrate, pool, sessions, calls, expected_fees, assignment):
+    extrinsics = {}
+    for i, (call, expected_fee, lane) in enumerate(zip(calls, expected_fees, assignment)):
+        if lane is not None:
+            extrinsics.setdefault(lane, []).append((i, sessions[lane].sign(call, expected_fee)))
+
+    extrinsic_hashes = [None] * len(calls)
+
+    def submit(substrate, lane):
+        for i, extrinsic in extrinsics[lane]:
+            try:
+                extrinsic_hashes[i] = sessions[lane].send(extrinsic, substrate)
+            except Exception as exc:
+                print(f"Unable to submit from {sessions[lane].signing_account} ({str(exc)}), stopping its lane")
+                sessions[lane].failed = True
+                return
+
+    run_concurrently(substrate, pool, [lambda substrate, lane=lane: submit(substrate, lane) for lane in extrinsics])
+
+    return extrinsic_hashes
@@ -0,0 +1,136 @@
+import json
+import os
+
+from scalecodec.base import ScaleBytes
+from substrateinterface import SubstrateInterface
+
+from .profiling import PROFILER
+
+
+#
+# CachedSubstrateInterface - SubstrateInterface keeping a snapshot of the runtime metadata and the chain
+#                            properties on disk, keyed by genesis hash (and specVersion for the metadata).
+#
+#                            On startup only the runtime version is checked against the node: the metadata is
+#                            decoded from the snapshot when the runtime did not change, and downloaded (and
+#                            stored) again after a runtime upgrade.
+#
+#                            When an RPCTrace is given, every JSON-RPC request is written to it.
+#
+#                            The address format, token decimals and symbol come from the chain properties, the
+#                            ones missing there are taken from the registry entry of the network, if given.
+#
+class CachedSubstrateInterface(SubstrateInterface):
+    def __init__(self, *args, cache_dir=None, rpc_trace=None, network_info=None, **kwargs):
+        self.cache_dir = os.path.join(cache_dir, 'metadata') if cache_dir is not None else None
+        self.rpc_trace = rpc_trace
+        self.network_info = network_info
+        self.__genesis_hash = None
+        self.__cached_properties = None
+
+        super().__init__(*args, **kwargs)
+
+    @property
+    def genesis_hash(self):
+        if self.__genesis_hash is None:
+            self.__genesis_hash = self.get_block_hash(0)
+        return self.__genesis_hash
+
+    @property
+    def properties(self):
+        if self.__cached_properties is None:
+            path = self.snapshot_path('properties.json')
+
+            if path is not None and os.path.exists(path):
+                with open(path, 'r') as f:
+                    properties = json.load(f)
+            else:
+                properties = super().properties
+
+                if path is not None:
+                    write_snapshot(path, json.dumps(properties).encode())
+
+            self.__cached_properties = with_network_defaults(properties, self.network_info)
+
+        return self.__cached_properties
+
+    def rpc_request(self, method, params, result_handler=None):
+        if self.rpc_trace is None:
+            return super().rpc_request(method, params, result_handler)
+
+        # The request id is the one the request is about to be sent with
+        return self.rpc_trace.request(
+            self.url,
+            {'id': self.request_id, 'method': method, 'params': params},
+            lambda: super(CachedSubstrateInterface, self).rpc_request(method, params, result_handler)
+        )
+
+    def init_runtime(self, block_hash=None, block_id=None):
+        with PROFILER.phase('init_runtime'):
+            return super().init_runtime(block_hash=block_hash, block_id=block_id)
+
+    def get_block_metadata(self, block_hash=None, decode=True):
+        path = self.snapshot_path(f"{self.runtime_version}.scale")
+
+        if not decode or path is None:
+            return super().get_block_metadata(block_hash=block_hash, decode=decode)
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                metadata = self.runtime_config.create_scale_object('MetadataVersioned', data=ScaleBytes(f.read()))
+            metadata.decode()
+
+            return metadata
+
+        metadata = super().get_block_metadata(block_hash=block_hash, decode=True)
+        write_snapshot(path, bytes(metadata.data.data))
+
+        return metadata
+
+    #
+    # snapshot_path - Path of a snapshot file of the connected chain, None when the cache is disabled.
+    #
+    def snapshot_path(self, name):
+        if self.cache_dir is None:
+            return None
+
+        return os.path.join(self.cache_dir, f"{self.genesis_hash}-{name}")
+
+
+#
+# with_network_defaults - Complete the chain properties with the ones of the network registry entry. Chains with
+#                         several tokens report lists, the first one (the native token) is used.
+#
+def with_network_defaults(properties, network_info):
+    properties = dict(properties or {})
+
+    for key in ['ss58Format', 'tokenDecimals', 'tokenSymbol']:
+        if isinstance(properties.get(key), list):
+            properties[key] = properties[key][0] if len(properties[key]) > 0 else None
+
+    if network_info is None:
+        return properties
+
+    defaults = {
+        'ss58Format': network_info['prefix'],
+        'tokenDecimals': network_info['decimals'],
+        'tokenSymbol': network_info['symbol'],
+    }
+    for key, value in defaults.items():
+        if properties.get(key) is None and value is not None:
+            properties[key] = value
+
+    return properties
+
+
+#
+# write_snapshot - Write a snapshot file atomically, so concurrent runs never read a partial one.
+#
+def write_snapshot(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+
+    os.replace(tmp_path, path)
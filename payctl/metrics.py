@@ -0,0 +1,196 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+# Name, type and help of the exported metrics
+METRICS_DEFINITIONS = {
+    'payctl_unclaimed_eras': ('gauge', "Number of eras with rewards pending to be claimed"),
+    'payctl_unclaimed_amount_planck': ('gauge', "Amount of the rewards pending to be claimed, in planck"),
+    'payctl_oldest_unclaimed_era': ('gauge', "Index of the oldest era with rewards pending to be claimed"),
+    'payctl_oldest_unclaimed_era_expiry_eras': ('gauge', "Eras left before the oldest unclaimed era falls out of HistoryDepth"),
+    'payctl_active_era': ('gauge', "Index of the active era"),
+    'payctl_history_depth': ('gauge', "Number of eras the rewards can be claimed for (HistoryDepth)"),
+    'payctl_last_payout_fee_planck': ('gauge', "Fee of the last payout extrinsic including the stash, in planck"),
+    'payctl_last_payout_success': ('gauge', "Whether the last payout extrinsic including the stash succeeded"),
+    'payctl_last_payout_timestamp_seconds': ('gauge', "Time of the last payout extrinsic including the stash"),
+    'payctl_rpc_storage_keys_total': ('counter', "Storage keys queried, by storage function"),
+    'payctl_rpc_query_duration_seconds': ('histogram', "Latency of the storage queries, by storage function"),
+}
+
+# Buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+#
+# MetricsRegistry - Thread-safe registry of the metrics values, rendered in the Prometheus text format.
+#
+#                   Series are identified by the metric name and their labels. Values are always recorded,
+#                   which is cheap, and only exported when the metrics server is running.
+#
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = dict((name, {}) for name in METRICS_DEFINITIONS)
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[name][labels_key(labels)] = value
+
+    def remove(self, name, **labels):
+        with self.lock:
+            self.values[name].pop(labels_key(labels), None)
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            key = labels_key(labels)
+            self.values[name][key] = self.values[name].get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            key = labels_key(labels)
+            if key not in self.values[name]:
+                self.values[name][key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0, 'count': 0}
+
+            histogram = self.values[name][key]
+            for i, bucket in enumerate(LATENCY_BUCKETS):
+                if value <= bucket:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    #
+    # timer - Context manager observing the time spent in its block on a histogram.
+    #
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = []
+
+        with self.lock:
+            for name, (metric_type, metric_help) in METRICS_DEFINITIONS.items():
+                lines.append(f"# HELP {name} {metric_help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+                for key, value in sorted(self.values[name].items()):
+                    if metric_type != 'histogram':
+                        lines.append(f"{name}{format_labels(key)} {value}")
+                        continue
+
+                    for bucket, count in zip(LATENCY_BUCKETS, value['buckets']):
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', str(bucket)),))} {count}")
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{format_labels(key)} {value['sum']}")
+                    lines.append(f"{name}_count{format_labels(key)} {value['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key):
+    if len(key) == 0:
+        return ""
+
+    labels = ",".join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in key
+    )
+    return f"{{{labels}}}"
+
+
+# Registry shared by all the commands (and networks) running in the process
+METRICS = MetricsRegistry()
+
+
+#
+# update_unclaimed_metrics - Set the unclaimed rewards metrics of the given accounts from the unclaimed
+#                            payouts of the window ({era: {stash: EraPayout}}).
+#
+def update_unclaimed_metrics(network, accounts, eras_payment_info, active_era, history_depth=None):
+    METRICS.set('payctl_active_era', active_era, network=network)
+    if history_depth is not None:
+        METRICS.set('payctl_history_depth', history_depth, network=network)
+
+    for stash in accounts:
+        payouts = [era[stash] for era in eras_payment_info.values() if stash in era and not era[stash].claimed]
+
+        METRICS.set('payctl_unclaimed_eras', len(payouts), network=network, stash=stash)
+        METRICS.set('payctl_unclaimed_amount_planck', sum(payout.amount for payout in payouts), network=network, stash=stash)
+
+        if len(payouts) == 0:
+            METRICS.remove('payctl_oldest_unclaimed_era', network=network, stash=stash)
+            METRICS.remove('payctl_oldest_unclaimed_era_expiry_eras', network=network, stash=stash)
+            continue
+
+        oldest_era = min(payout.era for payout in payouts)
+        METRICS.set('payctl_oldest_unclaimed_era', oldest_era, network=network, stash=stash)
+
+        if history_depth is not None:
+            METRICS.set(
+                'payctl_oldest_unclaimed_era_expiry_eras', oldest_era + history_depth - active_era,
+                network=network, stash=stash
+            )
+
+
+#
+# update_payout_metrics - Set the last payout metrics of the stashes included in a payout extrinsic, the fee
+#                         is None when the extrinsic was not included.
+#
+def update_payout_metrics(network, stashes, fee, success):
+    for stash in stashes:
+        if fee is not None:
+            METRICS.set('payctl_last_payout_fee_planck', fee, network=network, stash=stash)
+        METRICS.set('payctl_last_payout_success', 1 if success else 0, network=network, stash=stash)
+        METRICS.set('payctl_last_payout_timestamp_seconds', int(time.time()), network=network, stash=stash)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/', '/metrics']:
+            self.send_error(404)
+            return
+
+        body = METRICS.render().encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+metrics_server = None
+metrics_server_lock = threading.Lock()
+
+
+#
+# start_metrics_server - Serve the metrics over HTTP on a background thread. The server is shared by all the
+#                        networks of the process, so it is only started once.
+#
+def start_metrics_server(port, address=''):
+    global metrics_server
+
+    with metrics_server_lock:
+        if metrics_server is None:
+            metrics_server = MetricsServer((address, int(port)), MetricsRequestHandler)
+            threading.Thread(target=metrics_server.serve_forever, daemon=True).start()
+
+    return metrics_server
@@ -0,0 +1,55 @@
+import csv
+import json
+import sys
+
+
+#
+# write_json - Write the rows as a JSON array, one element per line as soon as each row is available.
+#
+def write_json(rows, fields, stream):
+    stream.write("[")
+
+    separator = "\n"
+    for row in rows:
+        stream.write(separator + json.dumps(dict((field, row[field]) for field in fields)))
+        stream.flush()
+        separator = ",\n"
+
+    stream.write("\n]\n" if separator != "\n" else "]\n")
+    stream.flush()
+
+
+#
+# write_ndjson - Write the rows as newline delimited JSON, one object per line.
+#
+def write_ndjson(rows, fields, stream):
+    for row in rows:
+        stream.write(json.dumps(dict((field, row[field]) for field in fields)) + "\n")
+        stream.flush()
+
+
+#
+# write_csv - Write the rows as CSV, with a header line with the field names.
+#
+def write_csv(rows, fields, stream):
+    writer = csv.writer(stream, lineterminator="\n")
+    writer.writerow(fields)
+
+    for row in rows:
+        writer.writerow([row[field] for field in fields])
+        stream.flush()
+
+
+OUTPUT_FORMATS = {
+    'json': write_json,
+    'ndjson': write_ndjson,
+    'csv': write_csv,
+}
+
+
+#
+# write_rows - Write an iterable of rows (dicts) in the given machine-readable format. Rows are written as
+#              they are produced, so a generator is consumed without holding all the rows in memory.
+#
+def write_rows(rows, fields, output_format, stream=None):
+    OUTPUT_FORMATS[output_format](rows, fields, stream if stream is not None else sys.stdout)
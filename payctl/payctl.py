@@ -1,219 +1,1001 @@
+import os
+import time
 from argparse import ArgumentParser
 from configparser import ConfigParser
 from collections import OrderedDict
-from substrateinterface import SubstrateInterface
 
+from .audit import AuditIndex, audit_payouts
+from .config import check_config
+from .fanout import run_fanout
+from .lanes import assign_lanes, submit_lanes
+from .metrics import start_metrics_server, update_payout_metrics, update_unclaimed_metrics
+from .output import OUTPUT_FORMATS, write_rows
+from .pool import RPCPool
+from .plan import build_plan, get_batch_payouts, read_plan, write_plan
+from .profiling import PROFILER
+from .rewards import get_eras_rewards_breakdown
+from .schedule import PayoutQueue, get_eras_left
+from .session import PayoutSession
+from .ss58 import ss58_decode
 from .utils import *
 
 
+DEFAULT_CONFIG = "/usr/local/etc/payctl/default.conf"
+
+# Fields of the machine-readable 'list' output, amounts are integer planck
+LIST_FIELDS = ['era', 'stash', 'amount', 'status', 'pending_pages', 'page_count']
+
+# Fields of the machine-readable 'audit' output, amounts are integer planck
+AUDIT_FIELDS = ['block', 'event', 'era', 'validator', 'page', 'stash', 'amount']
+
+# Port and seconds between updates of the metrics server
+METRICS_PORT = 9730
+METRICS_INTERVAL = 300
+
+# Commands serving the metrics, the long-running ones
+METRICS_COMMANDS = ['watch', 'serve-metrics']
+
+# Times the payouts of the extrinsics failed or not included are submitted again, on the lanes left
+SUBMIT_RETRIES = 2
+
+# Seconds to wait before reconnecting in watch mode, doubled on every consecutive failure
+WATCH_MIN_BACKOFF = 5
+WATCH_MAX_BACKOFF = 300
+
+# Seconds between checks of the finalized head, once an era change is seen on the best block
+WATCH_FINALITY_INTERVAL = 6
+
+
 #
 # cmd_list - 'list' subcommand handler.
 #
 def cmd_list(args, config):
-    substrate = SubstrateInterface(
-        url=get_config(args, config, 'rpcurl'),
-        type_registry_preset=get_type_preset(get_config(args, config, 'network'))
-    )
-
-    active_era = substrate.query(
-        module='Staking',
-        storage_function='ActiveEra'
-    )
-    active_era = active_era.value['index']
-
-    depth = get_config(args, config, 'deptheras')
-    depth = int(depth) if depth is not None else 84
+    substrate = get_substrate(args, config)
+
+    cache = get_era_cache(args, config, substrate)
+    block_hash, active_era, history_depth, eras = get_era_window(args, config, substrate, cache)
+
+    with get_rpc_pool(args, config, substrate) as pool:
+        eras_payment_info = get_eras_payment_info_filtered(
+            substrate, eras.start, eras.stop,
+            accounts=get_included_accounts(args, config),
+            only_unclaimed=args.only_unclaimed,
+            block_hash=block_hash,
+            cache=cache,
+            pool=pool
+        )
 
-    start = active_era - depth
-    end = active_era
+    if args.format != 'text':
+        write_rows(iter_list_rows(eras_payment_info), LIST_FIELDS, args.format)
+        return
 
-    eras_payment_info = get_eras_payment_info_filtered(
-        substrate, start, end,
-        accounts=get_included_accounts(args, config),
-        only_unclaimed=args.only_unclaimed
-    )
     eras_payment_info = OrderedDict(sorted(eras_payment_info.items(), reverse=True))
 
     for era_index, era in eras_payment_info.items():
         print(f"Era: {era_index}")
-        for accountId in era:
-            msg = "claimed" if era[accountId]['claimed'] else "unclaimed"
-            formatted_amount = format_balance_to_symbol(substrate, era[accountId]['amount'], substrate.token_decimals)
+        for accountId, payout in era.items():
+            if payout.claimed:
+                msg = "claimed"
+            elif len(payout.pages) < payout.page_count:
+                msg = f"partially claimed, {len(payout.pages)} of {payout.page_count} pages pending"
+            else:
+                msg = "unclaimed"
+            formatted_amount = format_balance_to_symbol(substrate, payout.amount)
 
             print(f"\t {accountId} => {formatted_amount} ({msg})")
 
 
 #
-# cmd_pay - 'pay' subcommand handler.
+# iter_list_rows - Generate the rows of the 'list' output era by era (newest first), with amounts in planck.
+#
+def iter_list_rows(eras_payment_info):
+    for era_index in sorted(eras_payment_info.keys(), reverse=True):
+        for payout in eras_payment_info[era_index].values():
+            yield {
+                'era': payout.era,
+                'stash': payout.stash,
+                'amount': payout.amount,
+                'status': payout.status,
+                'pending_pages': len(payout.pages),
+                'page_count': payout.page_count,
+            }
+
+
+#
+# cmd_rewards - 'rewards' subcommand handler.
+#
+def cmd_rewards(args, config):
+    substrate = get_substrate(args, config)
+
+    cache = get_era_cache(args, config, substrate)
+    block_hash, active_era, history_depth, eras = get_era_window(args, config, substrate, cache)
+
+    with get_rpc_pool(args, config, substrate) as pool:
+        eras_rewards_breakdown = get_eras_rewards_breakdown(
+            substrate, eras.start, eras.stop,
+            accounts=get_included_accounts(args, config),
+            block_hash=block_hash,
+            cache=cache,
+            pool=pool
+        )
+    eras_rewards_breakdown = OrderedDict(sorted(eras_rewards_breakdown.items(), reverse=True))
+
+    for era_index, era in eras_rewards_breakdown.items():
+        print(f"Era: {era_index}")
+        for accountId in era:
+            total = format_balance_to_symbol(substrate, era[accountId]['total'])
+            commission = format_balance_to_symbol(substrate, era[accountId]['commission'])
+            validator = format_balance_to_symbol(substrate, era[accountId]['validator'])
+
+            print(f"\t {accountId} => {total} (validator {validator}, commission {commission})")
+
+            if args.breakdown:
+                nominators = sorted(era[accountId]['nominators'].items(), key=lambda item: item[1], reverse=True)
+                for nominatorId, amount in nominators:
+                    print(f"\t\t {nominatorId} => {format_balance_to_symbol(substrate, amount)}")
+
+
+#
+# cmd_pay - 'pay' subcommand handler. Returns the exit status, 1 when any planned payout was not paid.
 #
 def cmd_pay(args, config):
-    substrate = SubstrateInterface(
-        url=get_config(args, config, 'rpcurl'),
-        type_registry_preset=get_config(args, config, 'network')
+    # Checked before connecting, nothing can be paid without signing
+    if not has_signing_key(args, config):
+        print("The signing key (SigningMnemonic, SigningSeed or SigningUri) is required to pay")
+        return 1
+
+    if args.from_plan is not None:
+        return pay_from_plan(args, config)
+
+    substrate = get_substrate(args, config)
+
+    block_hash, eras_payment_info = get_payable_eras(args, config, substrate)
+    if eras_payment_info is None:
+        return 0
+
+    return pay_eras(args, config, substrate, eras_payment_info, block_hash)
+
+
+#
+# cmd_plan - 'plan' subcommand handler.
+#
+#            Runs the discovery, batching and fee estimates of 'pay' and writes the resulting extrinsics to
+#            a plan file instead of submitting them, so only 'pay --from-plan' runs on the signing host.
+#            The signing key is not needed, just the signing account. Returns the exit status, 1 when the
+#            signing account is not given.
+#
+def cmd_plan(args, config):
+    if get_config(args, config, 'signingaccount') in [None, '']:
+        print("The signing account (SigningAccount) is required to plan the payouts")
+        return 1
+
+    substrate = get_substrate(args, config)
+
+    block_hash, eras_payment_info = get_payable_eras(args, config, substrate)
+    if eras_payment_info is None:
+        return
+
+    session, payout_batches, calls, expected_fees = plan_payouts(args, config, substrate, eras_payment_info, block_hash)
+
+    batch_mode = get_config(args, config, 'batchmode')
+    plan = build_plan(
+        substrate, get_config(args, config, 'network'), block_hash, session,
+        batch_mode if batch_mode is not None else 'batch', payout_batches, calls, expected_fees
     )
+    write_plan(args.out, plan)
 
-    active_era = substrate.query(
-        module='Staking',
-        storage_function='ActiveEra'
+    print(
+        f"Planned {sum(len(batch) for batch in payout_batches)} payout(s) in {len(calls)} extrinsic(s) " +
+        f"at block {plan['block_number']} (nonce {session.nonce}, " +
+        f"expected fees {format_balance_to_symbol(substrate, sum(expected_fees))}), written to {args.out}"
     )
-    active_era = active_era.value['index']
 
-    depth = get_config(args, config, 'deptheras')
-    depth = int(depth) if depth is not None else 84
 
+#
+# get_payable_eras - Collect the unclaimed eras to pay as of the finalized head, returned along with it. The eras
+#                    are None, after reporting why, when there is nothing to pay yet.
+#
+def get_payable_eras(args, config, substrate):
+    cache = get_era_cache(args, config, substrate)
+    block_hash, active_era, history_depth, eras = get_era_window(args, config, substrate, cache)
+
+    with get_rpc_pool(args, config, substrate) as pool:
+        eras_payment_info = get_eras_payment_info_filtered(
+            substrate, eras.start, eras.stop,
+            accounts=get_included_accounts(args, config),
+            only_unclaimed=True,
+            block_hash=block_hash,
+            cache=cache,
+            pool=pool
+        )
+
+    if len(eras_payment_info.keys()) == 0:
+        print(f"There are no rewards to claim in the last {len(eras)} era(s)")
+        return block_hash, None
+
+    if not is_payout_due(args, config, substrate, eras_payment_info, block_hash, history_depth):
+        return block_hash, None
+
+    return block_hash, eras_payment_info
+
+
+#
+# is_payout_due - Apply the payout policy to the eras with rewards to claim: pay once there are MinEras of them,
+#                 or as soon as the oldest one is within ExpiryEras of being pruned (after HistoryDepth eras).
+#                 Reports why when the payout is not due yet.
+#
+def is_payout_due(args, config, substrate, eras_payment_info, block_hash, history_depth):
     minEras = get_config(args, config, 'mineras')
     minEras = int(minEras) if minEras is not None else 5
 
-    start = active_era - depth
-    end = active_era
+    if len(eras_payment_info.keys()) >= minEras:
+        return True
+
+    expiryEras = get_config(args, config, 'expiryeras')
 
-    eras_payment_info = get_eras_payment_info_filtered(
-        substrate, start, end,
-        accounts=get_included_accounts(args, config),
-        only_unclaimed=True
+    if expiryEras is not None and history_depth is not None:
+        oldest_era = min(eras_payment_info.keys())
+        eras_left = get_eras_left(oldest_era, get_current_era(substrate, block_hash), history_depth)
+
+        if eras_left <= int(expiryEras):
+            print(
+                f"The rewards of era {oldest_era} can be claimed for {eras_left} more era(s), " +
+                f"which is within the expiry threshold ({expiryEras})"
+            )
+            return True
+
+    print(
+        f"There are rewards to claim on {len(eras_payment_info.keys())} era(s), " + 
+        f"but those are not enough to reach the minimum threshold ({minEras})"
+    )
+    return False
+
+
+#
+# pay_eras - Submit the payouts of the given (unclaimed) eras, composed with the runtime of the given block.
+#            Returns the exit status of submit_payouts.
+#
+def pay_eras(args, config, substrate, eras_payment_info, block_hash):
+    session, payout_batches, calls, expected_fees = plan_payouts(args, config, substrate, eras_payment_info, block_hash)
+
+    # The first lane planned the payouts, the rest of them (if any) only submit
+    sessions = [session] + [
+        PayoutSession(substrate, keypair, account) for keypair, account in get_signing_lanes(args, config, substrate)[1:]
+    ]
+
+    batch_mode = get_config(args, config, 'batchmode')
+
+    return submit_payouts(
+        args, config, substrate, sessions, [get_batch_payouts(batch) for batch in payout_batches], calls, expected_fees,
+        batch_mode if batch_mode is not None else 'batch', block_hash
     )
-    eras_payment_info = OrderedDict(sorted(eras_payment_info.items(), reverse=True))
 
-    if len(eras_payment_info.keys()) == 0:
-        print(f"There are no rewards to claim in the last {depth} era(s)")
-        return
 
-    if len(eras_payment_info.keys()) < minEras:
+#
+# pay_from_plan - Sign and submit the extrinsics of a plan written by 'plan'.
+#
+#                 Only the claims of the planned (era, stash) pairs are checked again, payouts claimed since
+#                 the plan was made are left out of their extrinsics, and the calls are checked against the
+#                 encoded calls of the plan. The plan is refused if it was made for
+#                 another chain, runtime or signing account, as its calls may not be valid anymore. Returns the
+#                 exit status, 1 when the plan is refused or any of its payouts was not paid.
+#
+def pay_from_plan(args, config):
+    try:
+        plan = read_plan(args.from_plan)
+    except (OSError, ValueError) as exc:
+        print(f"Unable to read plan: {str(exc)}")
+        return 1
+
+    substrate = get_substrate(args, config)
+
+    # The calls are composed with the runtime of the finalized head, which is loaded only once
+    block_hash = substrate.get_chain_finalised_head()
+    substrate.init_runtime(block_hash=block_hash)
+
+    keypair = get_keypair(args, config, substrate)
+
+    if plan['genesis_hash'] != substrate.genesis_hash:
+        print(f"The plan was made for another chain (genesis {plan['genesis_hash']})")
+        return 1
+
+    if plan['spec_version'] != substrate.runtime_version or plan['transaction_version'] != substrate.transaction_version:
         print(
-            f"There are rewards to claim on {len(eras_payment_info.keys())} era(s), " + 
-            f"but those are not enough to reach the minimum threshold ({minEras})"
+            f"The plan was made for runtime {plan['spec_version']}, " +
+            f"but the chain runs {substrate.runtime_version} now, plan the payouts again"
         )
-        return
+        return 1
 
-    keypair = get_keypair(args, config)
+    try:
+        signing_key = ss58_decode(plan['signing_account'])[1]
+    except (ValueError, TypeError) as exc:
+        print(f"The plan has an invalid signing account {plan['signing_account']} ({str(exc)})")
+        return 1
 
-    payout_calls = []
-    for era in eras_payment_info:
-        for accountId in eras_payment_info[era]:
-            payout_calls.append({
-                'call_module': 'Staking',
-                'call_function': 'payout_stakers',
-                'call_args': {
-                    'validator_stash': accountId,
-                    'era': era,
-                }
-            })
+    if signing_key != keypair.public_key:
+        print(f"The plan was made for the signing account {plan['signing_account']}, which does not match the signing key")
+        return 1
 
-    # Check if batch exstrinsic is available
-    batch_is_available = substrate.get_metadata_call_function('Utility', 'batch') is not None
-
-    # If batch extrinsic is available, we can batch all the payouts into a single extrinsic
-    if batch_is_available:
-        call = substrate.compose_call(
-            call_module='Utility',
-            call_function='batch',
-            call_params={
-                'calls': payout_calls
-            }
+    pending_payouts = get_unclaimed_payouts(substrate, [extrinsic['payouts'] for extrinsic in plan['extrinsics']])
+
+    payouts = []
+    calls = []
+    expected_fees = []
+
+    for extrinsic, extrinsic_payouts in zip(plan['extrinsics'], pending_payouts):
+        if len(extrinsic_payouts) == 0:
+            continue
+
+        # Calls are composed again from the payouts (locally), as decoded batch calls can not be signed. The ones
+        # with all their payouts pending must match the planned call
+        call = compose_batch(
+            substrate, compose_payout_calls(substrate, extrinsic_payouts, block_hash), plan['batch_mode'], block_hash
         )
 
-        # Reduce the list of extrinsics/calls to just the batched one
-        payout_calls = [call]
+        if len(extrinsic_payouts) == len(extrinsic['payouts']) and call.data.to_hex() != extrinsic['call']:
+            print("The planned calls do not match the payouts of the plan, plan the payouts again")
+            return 1
 
-    # If batch extrinsic is not available, let's create a payout extrinsic for each era and for each validator
-    else:
-        payout_calls = list(map(lambda call: substrate.compose_call(
-            call_module=call['call_module'],
-            call_function=call['call_function'],
-            call_params=call['call_args']
-        ), payout_calls))
-
-    for call in payout_calls:
-        payment_info = substrate.get_payment_info(call=call, keypair=keypair)
-        account_info = get_account_info(substrate, get_config(args, config, 'signingaccount'))
-
-        expected_fees = payment_info['partialFee']
-        free_balance = account_info['data']['free']
-        existential_deposit = get_existential_deposit(substrate)
-
-        if (free_balance - expected_fees) < existential_deposit:
-            print(f"Account with not enough funds. Needed {existential_deposit + expected_fees}, but got {free_balance}")
-            return
-
-        signature_payload = substrate.generate_signature_payload(
-            call=call,
-            nonce=account_info['nonce']
+        payouts.append(extrinsic_payouts)
+        calls.append(call)
+        # The fee of the planned extrinsic is an upper bound of the fee with fewer payouts
+        expected_fees.append(extrinsic['expected_fee'])
+
+    claimed = sum(len(extrinsic['payouts']) for extrinsic in plan['extrinsics']) - sum(len(batch) for batch in payouts)
+    if claimed > 0:
+        print(f"{claimed} planned payout(s) were claimed since block {plan['block_number']}, skipping them")
+
+    if len(calls) == 0:
+        print("There are no planned rewards left to claim")
+        return 0
+
+    session = PayoutSession(substrate, keypair, plan['signing_account'])
+
+    if session.nonce != plan['nonce']:
+        print(f"The account nonce moved from {plan['nonce']} to {session.nonce} since the plan was made, using {session.nonce}")
+
+    return submit_payouts(args, config, substrate, [session], payouts, calls, expected_fees, plan['batch_mode'], block_hash)
+
+
+#
+# get_unclaimed_payouts - Filter the [era, stash, page] payouts of each extrinsic, keeping the ones not claimed yet.
+#                         Only the claims of their (era, stash) pairs are looked up, non paged payouts are claimed
+#                         on the ledger.
+#
+def get_unclaimed_payouts(substrate, payouts):
+    block_hash = substrate.get_chain_finalised_head()
+
+    planned = [payout for extrinsic_payouts in payouts for payout in extrinsic_payouts]
+
+    paged_pairs = set((era, stash) for era, stash, page in planned if page is not None)
+    claims = get_eras_claims(substrate, list(paged_pairs), block_hash) if len(paged_pairs) > 0 else {}
+
+    legacy_stashes = set(stash for era, stash, page in planned if page is None)
+    ledgers = get_accounts_ledger(substrate, list(legacy_stashes), block_hash) if len(legacy_stashes) > 0 else {}
+
+    def is_claimed(era, stash, page):
+        if page is None:
+            return era in ledgers[stash]['legacy_claimed_rewards']
+
+        return page in claims.get((era, stash), set())
+
+    return [
+        [[era, stash, page] for era, stash, page in extrinsic_payouts if not is_claimed(era, stash, page)]
+        for extrinsic_payouts in payouts
+    ]
+
+
+#
+# submit_payouts - Sign and submit the planned extrinsics, given the [era, stash, page] payouts each one claims,
+#                  and report their inclusion.
+#
+#                  Each signing lane (session) submits on its own nonce sequence, concurrently with the other
+#                  lanes. Lanes that can not pay even the cheapest extrinsic are skipped. The payouts of the
+#                  extrinsics not submitted or not included are retried (up to SUBMIT_RETRIES times) on the
+#                  lanes that did not fail, leaving out the ones claimed meanwhile. Retried calls are composed
+#                  with the runtime of the given block, as the planned ones. Returns the exit status, 1 when any
+#                  extrinsic was not submitted, not included or failed (and its payouts are still unclaimed).
+#
+def submit_payouts(args, config, substrate, sessions, payouts, calls, expected_fees, batch_mode, block_hash):
+    lanes = []
+    for session in sessions:
+        if session.has_funds(min(expected_fees)):
+            lanes.append(session)
+            continue
+
+        print(
+            f"Account {session.signing_account} with not enough funds. " +
+            f"Needed {session.existential_deposit + min(expected_fees)}, but got {session.free_balance}"
         )
-        signature = keypair.sign(signature_payload)
 
-        extrinsic = substrate.create_signed_extrinsic(
-            call=call,
-            keypair=keypair,
-            nonce=account_info['nonce'],
-            signature=signature
+    if len(lanes) == 0:
+        return 1
+
+    # Lanes submit concurrently, each one on its own connection
+    pool = None
+    if len(lanes) > 1:
+        pool = RPCPool(
+            get_rpc_urls(args, config), lambda url: get_substrate(args, config, url), size=len(lanes), substrate=substrate
         )
 
-        if batch_is_available:
+    # Extrinsics left unpaid: not submitted for lack of funds, failed on dispatch, or not included after the retries
+    unpaid = 0
+
+    try:
+        for attempt in range(SUBMIT_RETRIES + 1):
+            if attempt > 0:
+                print(f"Retrying {len(calls)} extrinsic(s) on {len(lanes)} signing account(s)")
+
+            failed, not_paid = submit_to_lanes(args, config, substrate, pool, lanes, payouts, calls, expected_fees)
+            unpaid += not_paid
+
+            lanes = [lane for lane in lanes if not lane.failed]
+            if len(failed) == 0:
+                break
+
+            # The failed extrinsics are composed again, without the payouts claimed meanwhile
+            pending_payouts = get_unclaimed_payouts(substrate, [payouts[i] for i in failed])
+            retries = [
+                (extrinsic_payouts, expected_fees[i]) for i, extrinsic_payouts in zip(failed, pending_payouts)
+                if len(extrinsic_payouts) > 0
+            ]
+            if len(lanes) == 0 or attempt == SUBMIT_RETRIES:
+                unpaid += len(retries)
+                break
+
+            if len(retries) == 0:
+                break
+
+            payouts = [extrinsic_payouts for extrinsic_payouts, expected_fee in retries]
+            calls = [
+                compose_batch(substrate, compose_payout_calls(substrate, batch, block_hash), batch_mode, block_hash)
+                for batch in payouts
+            ]
+            expected_fees = [expected_fee for extrinsic_payouts, expected_fee in retries]
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if unpaid > 0:
+        print(f"{unpaid} extrinsic(s) were not submitted, not included or failed")
+        return 1
+
+    return 0
+
+
+#
+# submit_to_lanes - Spread the extrinsics among the lanes, submit them and wait for their inclusion. Extrinsics
+#                   are sorted by urgency, so when the lanes can not pay all of them only the first ones are
+#                   submitted. Returns the index of the extrinsics not submitted or not included by their lanes,
+#                   flagging those lanes as failed, and the number of extrinsics left unpaid otherwise (not
+#                   assigned to any lane, or included but failed), which are not worth retrying.
+#
+def submit_to_lanes(args, config, substrate, pool, lanes, payouts, calls, expected_fees):
+    assignment = assign_lanes(lanes, expected_fees)
+
+    unassigned = len([lane for lane in assignment if lane is None])
+    not_paid = unassigned
+    if unassigned > 0:
+        print(f"Not enough funds to pay the fees of {unassigned} of {len(calls)} extrinsic(s), submitting the most urgent ones")
+
+    nonces = [lane.nonce for lane in lanes]
+    for extrinsic_payouts, lane in zip(payouts, assignment):
+        if lane is None:
+            continue
+
+        account = f" from {lanes[lane].signing_account}" if len(lanes) > 1 else ""
+
+        if len(extrinsic_payouts) > 1:
             print(
-                "Submitting one batch extrinsic to claim " + 
-                f"rewards (in {len(eras_payment_info)} eras)"
+                f"Submitting batch extrinsic to claim {len(extrinsic_payouts)} " +
+                f"rewards (nonce {nonces[lane]}){account}"
             )
         else:
+            era, stash, page = extrinsic_payouts[0]
             print(
                 "Submitting single extrinsic to claim reward " +
-                f"for validator {call.value['call_args']['validator_stash']} " +
-                f"(in era {call.value['call_args']['era']})"
+                f"for validator {stash} " +
+                f"(in era {era}){account}"
             )
 
-        extrinsic_receipt = substrate.submit_extrinsic(
-            extrinsic=extrinsic,
-            wait_for_inclusion=True
-        )
+        nonces[lane] += 1
+
+    # Extrinsics are submitted back-to-back with locally incremented nonces, and then tracked together
+    from_block = substrate.get_block_number(substrate.get_chain_head())
+    extrinsic_hashes = submit_lanes(substrate, pool, lanes, calls, expected_fees, assignment)
+
+    failed = [i for i, lane in enumerate(assignment) if lane is not None and extrinsic_hashes[i] is None]
+    submitted = [i for i, extrinsic_hash in enumerate(extrinsic_hashes) if extrinsic_hash is not None]
+
+    with PROFILER.phase('pay: inclusion'):
+        extrinsic_receipts = wait_for_extrinsics(substrate, [extrinsic_hashes[i] for i in submitted], from_block)
+
+    network = get_config(args, config, 'network')
+
+    for i, extrinsic_receipt in zip(submitted, extrinsic_receipts):
+        print(f"\t Extrinsic hash: {extrinsic_hashes[i]}")
+
+        stashes = set(stash for era, stash, page in payouts[i])
+
+        if extrinsic_receipt is None:
+            print(f"\t Status: not included after {INCLUSION_MAX_BLOCKS} blocks")
+            update_payout_metrics(network, stashes, None, False)
+
+            failed.append(i)
+            lanes[assignment[i]].failed = True
+            continue
 
         fees = extrinsic_receipt.total_fee_amount
+        update_payout_metrics(network, stashes, fees, extrinsic_receipt.is_success)
 
-        print(f"\t Extrinsic hash: {extrinsic_receipt.extrinsic_hash}")
         print(f"\t Block hash: {extrinsic_receipt.block_hash}")
         print(f"\t Fee: {format_balance_to_symbol(substrate, fees)} ({fees})")
         print(f"\t Status: {'ok' if extrinsic_receipt.is_success else 'error'}")
         if not extrinsic_receipt.is_success:
             print(f"\t Error message: {extrinsic_receipt.error_message.get('docs')}")
+            not_paid += 1
+
+    return sorted(failed), not_paid
+
+
+#
+# plan_payouts - Compose the payout calls of the given (unclaimed) eras, pack them into extrinsics (the most
+#                urgent first, see PayoutQueue) and estimate their fees, without submitting anything. Returns the
+#                session of the signing account, the batches of payout calls, the call of each extrinsic and its
+#                expected fee. Calls are composed with the runtime of the given block, loaded only once.
+#
+def plan_payouts(args, config, substrate, eras_payment_info, block_hash):
+    lanes = get_signing_lanes(args, config, substrate)
+
+    # Fees can be estimated without the signing key, e.g. when only planning
+    if len(lanes) > 0:
+        keypair, signing_account = lanes[0]
+    else:
+        signing_account = get_config(args, config, 'signingaccount')
+        keypair = get_account_keypair(substrate, signing_account)
+
+    # Paged exposures are paid page by page, only for the pages not claimed yet
+    pay_by_page = substrate.get_metadata_call_function('Staking', 'payout_stakers_by_page', block_hash) is not None
+
+    # The payouts closest to expire are packed first, so they are the ones paid when not everything can be
+    queue = PayoutQueue()
+    queue.add_eras(eras_payment_info, by_page=pay_by_page)
+
+    payout_calls = compose_payout_calls(substrate, queue.pop_all(), block_hash)
+
+    batch_mode = get_config(args, config, 'batchmode')
+    batch_mode = batch_mode if batch_mode is not None else 'batch'
+
+    # Check if batch exstrinsic is available
+    batch_is_available = batch_mode != 'none' and substrate.get_metadata_call_function('Utility', batch_mode, block_hash) is not None
+
+    session = PayoutSession(substrate, keypair, signing_account)
+
+    # If batch extrinsic is available, pack the payouts into as few extrinsics as fit in a block,
+    # otherwise let's create a payout extrinsic for each era and for each validator
+    with PROFILER.phase('pay: plan'):
+        payout_batches = plan_payout_batches(
+            substrate, payout_calls, keypair, batch_mode if batch_is_available else None,
+            constants=session.constants,
+            payment_info=session.payment_info,
+            block_hash=block_hash
+        )
+        calls = [compose_batch(substrate, batch, batch_mode, block_hash) for batch in payout_batches]
+
+    # Check the fees of the whole plan before submitting anything
+    with PROFILER.phase('pay: fee estimate'):
+        expected_fees = session.estimate_fees(calls)
+
+    return session, payout_batches, calls, expected_fees
+
+
+#
+# cmd_watch - 'watch' subcommand handler.
+#
+#             Keeps a long-lived connection subscribed to ActiveEra. On every era change only the newly
+#             finished eras are evaluated, and payouts are triggered once the minimum threshold is met.
+#             Connection errors are retried with an exponential backoff, keeping the state in memory.
+#
+def cmd_watch(args, config):
+    if not has_signing_key(args, config):
+        print("The signing key (SigningMnemonic, SigningSeed or SigningUri) is required to watch and pay")
+        return 1
+
+    state = {'active_era': None, 'pending': {}, 'healthy': False}
+    backoff = WATCH_MIN_BACKOFF
+
+    try:
+        while True:
+            try:
+                state['healthy'] = False
+                substrate = get_substrate(args, config)
+
+                # The connection is closed before reconnecting, not left to the garbage collector
+                try:
+                    watch_eras(args, config, substrate, state)
+                finally:
+                    substrate.close()
+            except Exception as exc:
+                if state['healthy']:
+                    backoff = WATCH_MIN_BACKOFF
+
+                print(f"Connection error ({str(exc)}), reconnecting in {backoff} seconds")
+                time.sleep(backoff)
+
+                backoff = min(backoff * 2, WATCH_MAX_BACKOFF)
+    except KeyboardInterrupt:
+        return
+
+
+#
+# watch_eras - Evaluate the eras finished since the last known active era, pay if needed and wait for the next one.
+#
+def watch_eras(args, config, substrate, state):
+    cache = get_era_cache(args, config, substrate)
+    accounts = get_included_accounts(args, config)
+
+    # The pool connections and the cache are opened again on every reconnection
+    try:
+        with get_rpc_pool(args, config, substrate) as pool:
+            while True:
+                # Reads are pinned to the finalized head, the cache only keeps finalized data
+                block_hash, active_era, history_depth, eras = get_era_window(args, config, substrate, cache)
+
+                # The whole window is only evaluated the first time, afterwards just the newly finished eras
+                start = eras.start
+                if state['active_era'] is not None:
+                    start = max(start, state['active_era'])
+
+                if start < active_era:
+                    state['pending'].update(get_eras_payment_info_filtered(
+                        substrate, start, active_era,
+                        accounts=accounts,
+                        only_unclaimed=True,
+                        block_hash=block_hash,
+                        cache=cache,
+                        pool=pool
+                    ))
+
+                state['active_era'] = active_era
+                state['pending'] = dict((era, info) for era, info in state['pending'].items() if era in eras)
+                state['healthy'] = True
+
+                update_unclaimed_metrics(
+                    get_config(args, config, 'network'), accounts, state['pending'], active_era, history_depth
+                )
+
+                print(f"Era {active_era}: there are rewards to claim on {len(state['pending'])} era(s)")
+
+                if len(state['pending']) > 0 and is_payout_due(args, config, substrate, state['pending'], block_hash, history_depth):
+                    # Refresh the claims of the whole window, someone else may have paid meanwhile
+                    eras_payment_info = get_eras_payment_info_filtered(
+                        substrate, eras.start, eras.stop,
+                        accounts=accounts,
+                        only_unclaimed=True,
+                        block_hash=block_hash,
+                        cache=cache,
+                        pool=pool
+                    )
+
+                    if len(eras_payment_info) > 0:
+                        pay_eras(args, config, substrate, eras_payment_info, block_hash)
+
+                    state['pending'] = get_eras_payment_info_filtered(
+                        substrate, eras.start, eras.stop,
+                        accounts=accounts,
+                        only_unclaimed=True,
+                        block_hash=substrate.get_chain_finalised_head(),
+                        cache=cache,
+                        pool=pool
+                    )
+
+                # Block until the active era changes on the best block, and then until the change is finalized
+                substrate.query(
+                    module='Staking',
+                    storage_function='ActiveEra',
+                    subscription_handler=lambda obj, update_nr, subscription_id:
+                        obj.value['index'] if obj.value is not None and obj.value['index'] != active_era else None
+                )
+
+                while get_active_era(substrate, substrate.get_chain_finalised_head()) == active_era:
+                    time.sleep(WATCH_FINALITY_INTERVAL)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+#
+# cmd_audit - 'audit' subcommand handler.
+#
+#             Scans the blocks of an archive node for the payouts of the included validators, beyond what the
+#             staking storage keeps (HistoryDepth). The results are kept on an index, so re-runs only scan
+#             the blocks not scanned before.
+#
+def cmd_audit(args, config):
+    substrate = get_substrate(args, config)
+    pool = get_rpc_pool(args, config, substrate)
+
+    accounts = get_included_accounts(args, config)
+
+    cache_dir = get_cache_dir(args, config)
+    index = AuditIndex(
+        os.path.join(cache_dir, 'audit.sqlite') if cache_dir is not None else ':memory:',
+        get_config(args, config, 'network'),
+        substrate.genesis_hash
+    )
+
+    try:
+        to_block = args.to_block
+        if to_block is None:
+            to_block = substrate.get_block_number(substrate.get_chain_finalised_head())
+
+        # Without a starting block, continue from the first block scanned before
+        from_block = args.from_block
+        if from_block is None:
+            scanned_ranges = [ranges[0][0] for ranges in index.get_scanned_ranges(accounts).values() if len(ranges) > 0]
+            if len(scanned_ranges) == 0:
+                print("There are no blocks scanned before, the starting block (--from-block) is required")
+                return
+
+            from_block = min(scanned_ranges)
+
+        audit_payouts(substrate, index, accounts, from_block, to_block, pool=pool)
+
+        events = index.get_events(accounts, from_block, to_block)
+    finally:
+        pool.close()
+        index.close()
+
+    if args.format != 'text':
+        write_rows(events, AUDIT_FIELDS, args.format)
+        return
+
+    for accountId in accounts:
+        rewards = [event for event in events if event['stash'] == accountId and event['event'] == 'Rewarded']
+
+        print(f"Stash: {accountId}")
+        for event in rewards:
+            era = event['era'] if event['era'] is not None else 'unknown'
+            formatted_amount = format_balance_to_symbol(substrate, event['amount'])
+
+            print(f"\t Era {era} => {formatted_amount} (block {event['block']}, validator {event['validator']})")
+
+        total = format_balance_to_symbol(substrate, sum(event['amount'] for event in rewards))
+        print(f"\t Total: {total} in {len(rewards)} reward(s) between blocks {from_block} and {to_block}")
+
+
+#
+# cmd_serve_metrics - 'serve-metrics' subcommand handler.
+#
+#                     Serves the metrics over HTTP and refreshes the unclaimed rewards of the included
+#                     validators periodically. Connection errors are retried as in watch mode.
+#
+def cmd_serve_metrics(args, config):
+    start_metrics_server(get_config(args, config, 'metricsport') or METRICS_PORT)
+
+    interval = get_config(args, config, 'metricsinterval')
+    interval = int(interval) if interval is not None else METRICS_INTERVAL
+
+    substrate = None
+    backoff = WATCH_MIN_BACKOFF
+
+    try:
+        while True:
+            try:
+                if substrate is None:
+                    substrate = get_substrate(args, config)
+
+                collect_metrics(args, config, substrate)
+                backoff = WATCH_MIN_BACKOFF
+
+                time.sleep(interval)
+            except Exception as exc:
+                print(f"Connection error ({str(exc)}), reconnecting in {backoff} seconds")
+
+                # The broken connection is closed before opening a new one
+                if substrate is not None:
+                    substrate.close()
+                    substrate = None
+
+                time.sleep(backoff)
+
+                backoff = min(backoff * 2, WATCH_MAX_BACKOFF)
+    except KeyboardInterrupt:
+        return
+    finally:
+        if substrate is not None:
+            substrate.close()
+
+
+#
+# collect_metrics - Update the unclaimed rewards metrics of the included validators.
+#
+def collect_metrics(args, config, substrate):
+    cache = get_era_cache(args, config, substrate)
+
+    # Metrics are refreshed for the life of the process, so the cache is not left open between refreshes
+    try:
+        block_hash, active_era, history_depth, eras = get_era_window(args, config, substrate, cache)
+
+        accounts = get_included_accounts(args, config)
+
+        with get_rpc_pool(args, config, substrate) as pool:
+            eras_payment_info = get_eras_payment_info_filtered(
+                substrate, eras.start, eras.stop,
+                accounts=accounts,
+                only_unclaimed=True,
+                block_hash=block_hash,
+                cache=cache,
+                pool=pool
+            )
+    finally:
+        if cache is not None:
+            cache.close()
+
+    update_unclaimed_metrics(get_config(args, config, 'network'), accounts, eras_payment_info, active_era, history_depth)
+
+
+#
+# cmd_config_check - 'config check' subcommand handler, validates every config offline. Returns the exit status.
+#
+def cmd_config_check(args, configs):
+    status = 0
+
+    for config_path, config in configs:
+        problems = check_config(args, config)
+
+        if len(problems) == 0:
+            print(f"{config_path}: ok")
+            continue
+
+        print(f"{config_path}: {len(problems)} problem(s)")
+        for problem in problems:
+            print(f"\t {problem}")
+
+        status = 1
+
+    return status
+
 
 def main():
     args_parser = ArgumentParser(prog='payctl')
-    args_parser.add_argument("-c", "--config", help="read config from a file", default="/usr/local/etc/payctl/default.conf")
+    args_parser.add_argument("-c", "--config", help="read config from a file (can be repeated to run several networks)", action='append', default=None)
 
     args_parser.add_argument("-r", "--rpc-url", dest="rpcurl", help="substrate RPC Url")
     args_parser.add_argument("-n", "--network", dest="network", help="name of the network to connect")
     args_parser.add_argument("-d", "--depth-eras", dest="deptheras", help="depth of eras to include")
+    args_parser.add_argument("--cache-dir", dest="cachedir", help="directory of the era data cache")
+    args_parser.add_argument("-j", "--concurrency", dest="concurrency", help="number of concurrent RPC connections")
+    args_parser.add_argument("--no-cache", dest="no_cache", help="do not use the era data cache", action='store_true', default=False)
+    args_parser.add_argument("--profile", dest="profile", help="report the time spent on each phase of the run", action='store_true', default=False)
+    args_parser.add_argument("--trace-rpc", dest="tracerpc", metavar="FILE", help="write every RPC request and response to a file")
 
     args_subparsers = args_parser.add_subparsers(title="Commands", help='', dest="command")
 
     args_subparser_list = args_subparsers.add_parser("list", help="list rewards")
     args_subparser_list.add_argument("-u", "--unclaimed", dest="only_unclaimed", help='show unclaimed only', action='store_true', default=False)
+    args_subparser_list.add_argument("-f", "--format", dest="format", help='output format, amounts are in planck on machine-readable formats', choices=['text'] + list(OUTPUT_FORMATS.keys()), default='text')
     args_subparser_list.add_argument("validators", nargs='*', help="", default=None)
     
+    args_subparser_rewards = args_subparsers.add_parser("rewards", help="show how rewards are split between validators and nominators")
+    args_subparser_rewards.add_argument("--breakdown", dest="breakdown", help='show the reward of each nominator', action='store_true', default=False)
+    args_subparser_rewards.add_argument("validators", nargs='*', help="", default=None)
+
     args_subparser_pay = args_subparsers.add_parser('pay', help="pay rewards")
     args_subparser_pay.add_argument("validators", nargs='*', help="", default=None)
     args_subparser_pay.add_argument("-m", "--min-eras", dest="mineras", help="minum eras pending to pay to proceed payment")
+    args_subparser_pay.add_argument("-e", "--expiry-eras", dest="expiryeras", help="pay anyway when an era is within this number of eras of expiring")
+    args_subparser_pay.add_argument("-b", "--batch-mode", dest="batchmode", help="utility function used to batch payouts", choices=['batch', 'batch_all', 'force_batch', 'none'])
     args_subparser_pay.add_argument("-a", "--signing-account", dest="signingaccount", help="account used to sign requests")
     args_subparser_pay.add_argument("-n", "--signing-mnemonic", dest="signingmnemonic", help="mnemonic to generate the signing key")
     args_subparser_pay.add_argument("-s", "--signing-seed", dest="signingseed", help="seed to generate the signing key")
     args_subparser_pay.add_argument("-u", "--signing-uri", dest="signinguri", help="uri to generate the signing key")
+    args_subparser_pay.add_argument("--from-plan", dest="from_plan", metavar="FILE", help="sign and submit the payouts of a plan written by 'plan'")
+
+    args_subparser_plan = args_subparsers.add_parser('plan', help="plan the payouts to submit later with 'pay --from-plan'")
+    args_subparser_plan.add_argument("validators", nargs='*', help="", default=None)
+    args_subparser_plan.add_argument("-o", "--out", dest="out", metavar="FILE", help="file to write the plan to", required=True)
+    args_subparser_plan.add_argument("-m", "--min-eras", dest="mineras", help="minum eras pending to pay to proceed payment")
+    args_subparser_plan.add_argument("-e", "--expiry-eras", dest="expiryeras", help="pay anyway when an era is within this number of eras of expiring")
+    args_subparser_plan.add_argument("-b", "--batch-mode", dest="batchmode", help="utility function used to batch payouts", choices=['batch', 'batch_all', 'force_batch', 'none'])
+    args_subparser_plan.add_argument("-a", "--signing-account", dest="signingaccount", help="account that will sign the payouts")
+
+    args_subparser_watch = args_subparsers.add_parser('watch', help="watch era changes and pay rewards")
+    args_subparser_watch.add_argument("validators", nargs='*', help="", default=None)
+    args_subparser_watch.add_argument("-m", "--min-eras", dest="mineras", help="minum eras pending to pay to proceed payment")
+    args_subparser_watch.add_argument("-e", "--expiry-eras", dest="expiryeras", help="pay anyway when an era is within this number of eras of expiring")
+    args_subparser_watch.add_argument("-b", "--batch-mode", dest="batchmode", help="utility function used to batch payouts", choices=['batch', 'batch_all', 'force_batch', 'none'])
+    args_subparser_watch.add_argument("-a", "--signing-account", dest="signingaccount", help="account used to sign requests")
+    args_subparser_watch.add_argument("-n", "--signing-mnemonic", dest="signingmnemonic", help="mnemonic to generate the signing key")
+    args_subparser_watch.add_argument("-s", "--signing-seed", dest="signingseed", help="seed to generate the signing key")
+    args_subparser_watch.add_argument("-u", "--signing-uri", dest="signinguri", help="uri to generate the signing key")
+    args_subparser_watch.add_argument("--metrics-port", dest="metricsport", help="serve prometheus metrics on this port")
+
+    args_subparser_audit = args_subparsers.add_parser('audit', help="scan the blocks of an archive node for past payouts")
+    args_subparser_audit.add_argument("validators", nargs='*', help="", default=None)
+    args_subparser_audit.add_argument("--from-block", dest="from_block", type=int, help="first block to scan (defaults to the first one scanned before)")
+    args_subparser_audit.add_argument("--to-block", dest="to_block", type=int, help="last block to scan (defaults to the finalized head)")
+    args_subparser_audit.add_argument("-f", "--format", dest="format", help='output format, amounts are in planck on machine-readable formats', choices=['text'] + list(OUTPUT_FORMATS.keys()), default='text')
+
+    args_subparser_config = args_subparsers.add_parser('config', help="check the config without connecting to the chain")
+    args_subparser_config.add_argument("action", choices=['check'], help="validate the sections, addresses and signing keys")
+
+    args_subparser_metrics = args_subparsers.add_parser('serve-metrics', help="serve prometheus metrics of the unclaimed rewards")
+    args_subparser_metrics.add_argument("validators", nargs='*', help="", default=None)
+    args_subparser_metrics.add_argument("-i", "--interval", dest="metricsinterval", help="seconds between updates of the metrics")
+    args_subparser_metrics.add_argument("--metrics-port", dest="metricsport", help="serve prometheus metrics on this port")
 
     args = args_parser.parse_args()
 
-    try:
-        config = ConfigParser()
-        config.read_file(open(args.config))
-    except Exception as exc:
-        print(f"Unable to read config: {str(exc)}")
-        exit(0)
+    configs = []
+
+    for config_path in args.config if args.config is not None else [DEFAULT_CONFIG]:
+        try:
+            config = ConfigParser()
+            config.read_file(open(config_path))
+        except Exception as exc:
+            print(f"Unable to read config: {str(exc)}")
+            exit(1 if args.command == 'config' else 0)
+
+        configs.append((config_path, config))
 
     if not args.command:
         args_parser.print_help()
         exit(1)
 
-    if args.command == 'list':
-        cmd_list(args, config)
-    if args.command == 'pay':
-        cmd_pay(args, config)
+    if args.command == 'config':
+        exit(cmd_config_check(args, configs))
+
+    commands = {
+        'list': cmd_list,
+        'rewards': cmd_rewards,
+        'pay': cmd_pay,
+        'plan': cmd_plan,
+        'watch': cmd_watch,
+        'audit': cmd_audit,
+        'serve-metrics': cmd_serve_metrics,
+    }
+
+    # The metrics server is shared by all the configs, it is started by the first one that sets a port. Only the
+    # long-running commands serve it, the rest exit before it could be scraped
+    for config_path, config in configs:
+        if args.command in METRICS_COMMANDS and get_config(args, config, 'metricsport') is not None:
+            start_metrics_server(get_config(args, config, 'metricsport'))
+            break
+
+    if args.profile:
+        PROFILER.enable()
+
+    try:
+        run_command(commands[args.command], args, configs)
+    finally:
+        if args.profile:
+            PROFILER.report()
+
+
+#
+# run_command - Run a command handler for the given configs, concurrently when there are several of them.
+#
+def run_command(handler, args, configs):
+    if len(configs) == 1:
+        # Handlers may return an exit status, as 'pay' does
+        status = handler(args, configs[0][1])
+        if status:
+            exit(status)
+        return
+
+    # Several configs (networks) run concurrently in this process, each one with its own connection
+    names = [config['Defaults'].get('network', config_path) for config_path, config in configs]
+    if len(set(names)) != len(names):
+        names = [config_path for config_path, config in configs]
 
+    failed = run_fanout(
+        handler, args, list(zip(names, [config for config_path, config in configs])),
+        stream=args.command in ['watch', 'serve-metrics']
+    )
+
+    if failed > 0:
+        exit(1)
 
 if __name__ == '__main__':
     main()
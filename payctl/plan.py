@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+
+PLAN_VERSION = 1
+
+
+#
+# build_plan - Describe the planned extrinsics of a payout run, to be signed and submitted later (maybe on
+#              another host) with 'pay --from-plan'. Every extrinsic carries its encoded call, its expected
+#              fee and the (era, stash, page) payouts it claims, page being None on non paged payouts.
+#
+def build_plan(substrate, network, block_hash, session, batch_mode, payout_batches, calls, expected_fees):
+    return {
+        'version': PLAN_VERSION,
+        'network': network,
+        'genesis_hash': substrate.genesis_hash,
+        'spec_version': substrate.runtime_version,
+        'transaction_version': substrate.transaction_version,
+        'block_number': substrate.get_block_number(block_hash),
+        'block_hash': block_hash,
+        'signing_account': session.signing_account,
+        'nonce': session.nonce,
+        'batch_mode': batch_mode,
+        'extrinsics': [
+            {
+                'call': call.data.to_hex(),
+                'expected_fee': expected_fee,
+                'payouts': get_batch_payouts(batch),
+            }
+            for batch, call, expected_fee in zip(payout_batches, calls, expected_fees)
+        ],
+    }
+
+
+#
+# get_batch_payouts - Get the [era, stash, page] payouts claimed by a batch of payout calls.
+#
+def get_batch_payouts(batch):
+    return [
+        [call.value['call_args']['era'], call.value['call_args']['validator_stash'], call.value['call_args'].get('page')]
+        for call in batch
+    ]
+
+
+#
+# write_plan - Write a plan along with the sha256 of its canonical form, so a truncated or edited file is
+#              detected before anything is signed.
+#
+def write_plan(path, plan):
+    with open(path, 'w') as file:
+        json.dump({'plan': plan, 'sha256': plan_digest(plan)}, file, separators=(',', ':'))
+
+
+#
+# read_plan - Read a plan written by write_plan. Raises ValueError when the file is not a valid plan.
+#
+def read_plan(path):
+    with open(path) as file:
+        try:
+            content = json.load(file)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"invalid JSON ({str(exc)})")
+
+    if not isinstance(content, dict) or 'plan' not in content or 'sha256' not in content:
+        raise ValueError("not a payout plan")
+
+    if plan_digest(content['plan']) != content['sha256']:
+        raise ValueError("checksum mismatch, the plan is corrupted or was modified")
+
+    if content['plan'].get('version') != PLAN_VERSION:
+        raise ValueError(f"unsupported plan version {content['plan'].get('version')}, expected {PLAN_VERSION}")
+
+    return content['plan']
+
+
+def plan_digest(plan):
+    return hashlib.sha256(json.dumps(plan, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
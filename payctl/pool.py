@@ -0,0 +1,124 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+#
+# RPCPool - Pool of connections to one or several RPC endpoints, used to run blocking RPC jobs concurrently.
+#
+#           A job is a callable receiving the connection (SubstrateInterface) it must use. Jobs are run on an
+#           executor of 'size' workers, each running job holding its own connection, so the requests of
+#           different jobs are pipelined instead of waiting on each other. Connections are opened lazily with
+#           'factory(url)' and spread over the given URLs.
+#
+#           Jobs should be leaves (single requests or chunks of them) given as one flat list, so all the
+#           connections share the whole work. They run on a copy of the context of the caller, so context
+#           variables (e.g. the output capture of run_fanout) apply to them too.
+#
+class RPCPool:
+    def __init__(self, urls, factory, size=1, substrate=None):
+        self.urls = urls
+        self.factory = factory
+        self.size = max(int(size), 1)
+
+        self.substrate = substrate
+        self.idle = [substrate] if substrate is not None else []
+        self.opened = []
+
+        # Number of connections, the given one included
+        self.count = len(self.idle)
+
+        self.lock = threading.Lock()
+        self.executor = None
+
+        # Connection held by the job running on the current thread, if any
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #
+    # connect - Open a new connection, picking the URLs in a round-robin fashion.
+    #
+    def connect(self):
+        with self.lock:
+            url = self.urls[self.count % len(self.urls)]
+            self.count += 1
+
+        substrate = self.factory(url)
+
+        with self.lock:
+            self.opened.append(substrate)
+
+        return substrate
+
+    #
+    # gather - Run the given jobs concurrently and return their results in the same order.
+    #
+    def gather(self, jobs):
+        substrate = getattr(self.local, 'substrate', None)
+
+        # Jobs started from another job run sequentially on the connection it already holds, waiting for the
+        # workers from one of them could block all of them
+        if substrate is not None:
+            return [job(substrate) for job in jobs]
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.size)
+
+        futures = [self.executor.submit(contextvars.copy_context().run, self._run, job) for job in jobs]
+
+        return [future.result() for future in futures]
+
+    #
+    # map - Run 'fn(substrate, item)' concurrently for each of the items.
+    #
+    def map(self, fn, items):
+        return self.gather([lambda substrate, item=item: fn(substrate, item) for item in items])
+
+    #
+    # close - Stop the workers and close the connections opened by the pool.
+    #
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        for substrate in self.opened:
+            substrate.close()
+
+        self.idle = [self.substrate] if self.substrate is not None else []
+        self.opened = []
+        self.count = len(self.idle)
+
+    def _run(self, job):
+        # There are as many workers as connections, so a connection is always idle or can be opened
+        with self.lock:
+            substrate = self.idle.pop() if len(self.idle) > 0 else None
+
+        if substrate is None:
+            substrate = self.connect()
+
+        self.local.substrate = substrate
+
+        try:
+            return job(substrate)
+        finally:
+            self.local.substrate = None
+
+            with self.lock:
+                self.idle.append(substrate)
+
+
+#
+# run_concurrently - Run the jobs on the pool if there is one, or sequentially on the given connection otherwise.
+#
+def run_concurrently(substrate, pool, jobs):
+    if pool is None or len(jobs) <= 1:
+        return [job(substrate) for job in jobs]
+
+    return pool.gather(jobs)
@@ -0,0 +1,136 @@
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+#
+# Profiler - Wall time spent on each phase (helper function or command stage) of a run.
+#
+#            Times are inclusive, a phase includes the phases started from it, and phases running
+#            concurrently on a pool are all accounted, so their sum can be above the run wall time.
+#            Nothing is recorded unless the profiler is enabled.
+#
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+
+            with self.lock:
+                calls, total, longest = self.phases.get(name, (0, 0, 0))
+                self.phases[name] = (calls + 1, total + elapsed, max(longest, elapsed))
+
+    def report(self, stream=None):
+        stream = stream if stream is not None else sys.stderr
+
+        with self.lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][1], reverse=True)
+
+        stream.write(f"Profile (wall time {time.perf_counter() - self.started:.3f}s):\n")
+        stream.write(f"\t{'phase':<40} {'calls':>7} {'total':>10} {'avg':>10} {'max':>10}\n")
+
+        for name, (calls, total, longest) in phases:
+            stream.write(f"\t{name:<40} {calls:>7} {total:>9.3f}s {total / calls:>9.3f}s {longest:>9.3f}s\n")
+
+        stream.flush()
+
+
+# Profiler shared by all the commands (and networks) running in the process
+PROFILER = Profiler()
+
+
+#
+# profiled - Decorator accounting the calls to a function as a phase named after it.
+#
+def profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return fn(*args, **kwargs)
+
+        with PROFILER.phase(fn.__name__):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+#
+# RPCTrace - Writer of a trace of the JSON-RPC requests, one JSON object per line with the request, the response,
+#            their timestamps and payload sizes. It can be shared by several connections (and threads).
+#
+class RPCTrace:
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    #
+    # request - Perform a request with 'fn' and trace it, the response (or error) is returned (raised) unchanged.
+    #
+    def request(self, endpoint, payload, fn):
+        entry = {
+            'endpoint': endpoint,
+            'id': payload.get('id'),
+            'method': payload.get('method'),
+            'params': payload.get('params'),
+            'request_bytes': len(json.dumps(payload, default=str)),
+            'requested_at': time.time(),
+        }
+
+        try:
+            response = fn()
+            entry['response'] = response
+            entry['response_bytes'] = len(json.dumps(response, default=str))
+            return response
+        except Exception as exc:
+            entry['error'] = str(exc)
+            raise
+        finally:
+            entry['responded_at'] = time.time()
+            entry['duration'] = entry['responded_at'] - entry['requested_at']
+            self.write(entry)
+
+    def write(self, entry):
+        line = json.dumps(entry, default=str)
+
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+rpc_traces = {}
+rpc_traces_lock = threading.Lock()
+
+
+#
+# get_rpc_trace - Get the trace writer of a file, opened once per process.
+#
+def get_rpc_trace(path):
+    with rpc_traces_lock:
+        if path not in rpc_traces:
+            rpc_traces[path] = RPCTrace(path)
+
+        return rpc_traces[path]
@@ -0,0 +1,30 @@
+#
+# EraPayout - Payout of a validator (stash) on an era. The amount is kept as integer planck, and 'pages' are
+#             the exposure pages still pending to be paid out of 'page_count'.
+#
+#             Slotted, as one record is created for each tracked validator on every era of the window.
+#
+class EraPayout:
+    __slots__ = ('era', 'stash', 'amount', 'pages', 'page_count')
+
+    def __init__(self, era, stash, amount, pages, page_count):
+        self.era = era
+        self.stash = stash
+        self.amount = amount
+        self.pages = pages
+        self.page_count = page_count
+
+    @property
+    def claimed(self):
+        return len(self.pages) == 0
+
+    @property
+    def status(self):
+        if self.claimed:
+            return "claimed"
+        if len(self.pages) < self.page_count:
+            return "partially_claimed"
+        return "unclaimed"
+
+    def __repr__(self):
+        return f"EraPayout(era={self.era}, stash={self.stash}, amount={self.amount}, pages={self.pages}, page_count={self.page_count})"
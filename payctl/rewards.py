@@ -0,0 +1,201 @@
+from .utils import PERBILL, get_eras_rewards, has_paged_exposures, query_storage_requests
+
+
+# numpy is optional (payctl[breakdown]), and only loaded when a breakdown is computed
+np = None
+
+# Values from this magnitude are computed on Python integers, int64 would overflow in the intermediate products
+INT64_SAFE_LIMIT = 2**59
+
+
+#
+# load_numpy - Import numpy on first use.
+#
+def load_numpy():
+    global np
+
+    if np is not None:
+        return
+
+    try:
+        import numpy
+    except ImportError:
+        raise Exception("the rewards breakdown requires numpy, install it with 'pip install payctl[breakdown]'")
+
+    np = numpy
+
+
+#
+# to_array - Build an integer array for the given values, int64 when they are small enough (balances are u128).
+#
+def to_array(values):
+    values = list(values)
+
+    if len(values) > 0 and max(values) >= INT64_SAFE_LIMIT:
+        return np.array(values, dtype=object)
+
+    return np.array(values, dtype=np.int64)
+
+
+#
+# perbill_from_rational_array - Vectorized Perbill::from_rational(p, q), rounding down as the runtime does.
+#
+#                               The parts are computed by long division, one decimal digit at a time, so
+#                               no intermediate product goes over 10 * q.
+#
+def perbill_from_rational_array(p, q):
+    saturated = p >= q
+    remainder = np.where(saturated, 0, p)
+    divisor = np.where(q == 0, 1, q)
+
+    parts = np.zeros_like(remainder)
+    for _ in range(9):
+        remainder = remainder * 10
+        parts = parts * 10 + remainder // divisor
+        remainder = remainder % divisor
+
+    return np.where(saturated, PERBILL, parts)
+
+
+#
+# perbill_mul_array - Vectorized Perbill * n, rounding to the nearest (half down) as the runtime does.
+#
+def perbill_mul_array(parts, n):
+    quotient, remainder = n // PERBILL, n % PERBILL
+    correction = remainder * parts
+
+    return quotient * parts + correction // PERBILL + np.where((correction % PERBILL) * 2 > PERBILL, 1, 0)
+
+
+#
+# get_eras_exposures - Collect the commission and exposure of a list of (era, stash) pairs, as
+#                      {(era, stash): {'commission', 'total', 'own', 'pages', 'others'}}, where 'pages' is
+#                      the stake of each page (page 0 includes the own stake) and 'others' the list of
+#                      (nominator, value). Eras previous to paged exposures are read from ErasStakersClipped.
+#
+def get_eras_exposures(substrate, pairs, block_hash=None, pool=None):
+    paged = has_paged_exposures(substrate, block_hash)
+    clipped = substrate.get_metadata_storage_function('Staking', 'ErasStakersClipped', block_hash) is not None
+    params_list = [[era, stash] for era, stash in pairs]
+
+    prefs, overviews = query_storage_requests(substrate, [
+        ('Staking', 'ErasValidatorPrefs', params_list),
+        ('Staking', 'ErasStakersOverview', params_list if paged else []),
+    ], block_hash, pool)
+
+    exposures = {}
+    pages_params = []
+    legacy_params = []
+
+    for era, stash in pairs:
+        overview = overviews.get((era, stash))
+
+        if overview is None or overview.value is None:
+            legacy_params.append([era, stash])
+            continue
+
+        exposures[(era, stash)] = {
+            'total': overview.value['total'],
+            'own': overview.value['own'],
+            'pages': [overview.value['own']] + [0] * max(overview.value['page_count'] - 1, 0),
+            'others': [],
+        }
+        pages_params += [[era, stash, page] for page in range(overview.value['page_count'])]
+
+    pages, clipped_exposures = query_storage_requests(substrate, [
+        ('Staking', 'ErasStakersPaged', pages_params),
+        ('Staking', 'ErasStakersClipped', legacy_params if clipped else []),
+    ], block_hash, pool)
+
+    for (era, stash, page), exposure_page in pages.items():
+        if exposure_page.value is None:
+            continue
+
+        exposures[(era, stash)]['pages'][page] += exposure_page.value['page_total']
+        exposures[(era, stash)]['others'] += [(other['who'], other['value']) for other in exposure_page.value['others']]
+
+    for (era, stash), exposure in clipped_exposures.items():
+        # Validators not elected on the era have an empty exposure
+        if exposure.value is None or exposure.value['total'] == 0:
+            continue
+
+        exposures[(era, stash)] = {
+            'total': exposure.value['total'],
+            'own': exposure.value['own'],
+            'pages': [exposure.value['total']],
+            'others': [(other['who'], other['value']) for other in exposure.value['others']],
+        }
+
+    for (era, stash), exposure in exposures.items():
+        value = prefs[(era, stash)].value if (era, stash) in prefs else None
+        exposure['commission'] = value['commission'] if value is not None else 0
+
+    return exposures
+
+
+#
+# get_eras_rewards_breakdown - Compute how the reward of the given validators is split between the validator
+#                              (commission and own stake) and each one of its nominators, as
+#                              {era: {stash: {'total', 'commission', 'validator', 'nominators': {who: amount}}}}.
+#
+#                              All the eras and validators are computed in a single vectorized pass over the
+#                              flattened exposures, following the same Perbill arithmetic as the runtime.
+#
+def get_eras_rewards_breakdown(substrate, start, end, accounts, block_hash=None, cache=None, pool=None):
+    load_numpy()
+
+    eras_rewards = get_eras_rewards(substrate, start, end, block_hash, cache, pool)
+
+    pairs = [
+        (era, stash) for era in sorted(eras_rewards) for stash in accounts
+        if eras_rewards[era]['individual'].get(stash, 0) > 0
+    ]
+    exposures = get_eras_exposures(substrate, pairs, block_hash, pool)
+    pairs = [pair for pair in pairs if pair in exposures]
+
+    if len(pairs) == 0:
+        return {}
+
+    # Per validator (and era) values
+    points = to_array(eras_rewards[era]['individual'][stash] for era, stash in pairs)
+    total_points = to_array(eras_rewards[era]['total'] for era, stash in pairs)
+    era_payout = to_array(eras_rewards[era]['reward'] for era, stash in pairs)
+    commission = to_array(exposures[pair]['commission'] for pair in pairs)
+    total = to_array(exposures[pair]['total'] for pair in pairs)
+    own = to_array(exposures[pair]['own'] for pair in pairs)
+
+    # Per page and per nominator values, along with the index of their validator
+    page_index = to_array(i for i, pair in enumerate(pairs) for _ in exposures[pair]['pages'])
+    page_total = to_array(stake for pair in pairs for stake in exposures[pair]['pages'])
+    nominator_index = to_array(i for i, pair in enumerate(pairs) for _ in exposures[pair]['others'])
+    nominator_value = to_array(value for pair in pairs for who, value in exposures[pair]['others'])
+
+    total_payout = perbill_mul_array(perbill_from_rational_array(points, total_points), era_payout)
+    total_commission = perbill_mul_array(commission, total_payout)
+    leftover = total_payout - total_commission
+
+    # The commission is paid across the pages, proportionally to their stake
+    page_commission = perbill_mul_array(perbill_from_rational_array(page_total, total[page_index]), total_commission[page_index])
+    commission_payout = np.zeros_like(total_payout)
+    np.add.at(commission_payout, page_index, page_commission)
+
+    validator_payout = commission_payout + perbill_mul_array(perbill_from_rational_array(own, total), leftover)
+    nominator_payout = perbill_mul_array(
+        perbill_from_rational_array(nominator_value, total[nominator_index]), leftover[nominator_index]
+    )
+
+    breakdown = {}
+
+    for i, (era, stash) in enumerate(pairs):
+        breakdown.setdefault(era, {})[stash] = {
+            'total': int(total_payout[i]),
+            'commission': int(commission_payout[i]),
+            'validator': int(validator_payout[i]),
+            'nominators': {},
+        }
+
+    nominators = [(pair, who) for pair in pairs for who, value in exposures[pair]['others']]
+    for ((era, stash), who), amount in zip(nominators, nominator_payout):
+        breakdown[era][stash]['nominators'][who] = breakdown[era][stash]['nominators'].get(who, 0) + int(amount)
+
+    return breakdown
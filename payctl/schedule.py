@@ -0,0 +1,51 @@
+import heapq
+
+
+#
+# PayoutQueue - Priority queue of the pending [era, stash, page] payouts, the most urgent first. Rewards can only be
+#               claimed for HistoryDepth eras, so the oldest eras are the closest to be lost. Payouts of the same
+#               era are ordered by stash and page, so the plans are deterministic.
+#
+#               Packing the payouts in the order they are popped fills the first extrinsics (the ones submitted
+#               even when the balance or the block limits do not allow all of them) with the most urgent work.
+#
+class PayoutQueue:
+    def __init__(self):
+        self.heap = []
+
+    #
+    # add_eras - Queue the pending pages of the payouts of {era: {stash: EraPayout}}, or a single payout (page
+    #            None) per era and stash when the runtime does not pay by page.
+    #
+    def add_eras(self, eras_payment_info, by_page=True):
+        for era, payouts in eras_payment_info.items():
+            for stash, payout in payouts.items():
+                for page in (payout.pages if by_page else [None]):
+                    self.heap.append(self.entry(era, stash, page))
+
+        heapq.heapify(self.heap)
+
+    def entry(self, era, stash, page):
+        # Non paged payouts sort before any page of the same era and stash
+        return era, stash, page if page is not None else -1, page
+
+    def pop(self):
+        era, stash, _, page = heapq.heappop(self.heap)
+        return [era, stash, page]
+
+    #
+    # pop_all - Empty the queue, returning the payouts from the most to the least urgent.
+    #
+    def pop_all(self):
+        return [self.pop() for _ in range(len(self.heap))]
+
+    def __len__(self):
+        return len(self.heap)
+
+
+#
+# get_eras_left - Get the number of eras left to claim the rewards of an era, they are pruned once it is more than
+#                 HistoryDepth eras behind the current era.
+#
+def get_eras_left(era, current_era, history_depth):
+    return era + history_depth - current_era
@@ -0,0 +1,95 @@
+from .profiling import PROFILER
+from .utils import get_account_info, get_constants_index, get_existential_deposit
+
+
+#
+# PayoutSession - State of a signing account (lane) along a payout run.
+#
+#                 The metadata constants, nonce and balance are loaded once when the session starts.
+#                 After that, the nonce and the projected free balance are tracked locally on every
+#                 submission, so submitting many extrinsics does not need any extra RPC besides the
+#                 submission itself.
+#
+class PayoutSession:
+    def __init__(self, substrate, keypair, signing_account):
+        self.substrate = substrate
+        self.keypair = keypair
+        self.signing_account = signing_account
+
+        self.constants = get_constants_index(substrate)
+        self.existential_deposit = get_existential_deposit(substrate, self.constants)
+
+        account_info = get_account_info(substrate, signing_account)
+        self.free_balance = account_info['data']['free']
+
+        # The next index also counts the extrinsics of the account already in the pool
+        self.nonce = substrate.get_account_nonce(signing_account)
+
+        self.extrinsic_hashes = []
+
+        # Set when a submission of the account failed or was not included, its next nonces may be stuck
+        self.failed = False
+
+        self.payment_infos = {}
+
+    #
+    # payment_info - Get the payment info (weight and fee) of a call, estimated only once per call.
+    #
+    def payment_info(self, call):
+        key = call.data.to_hex()
+
+        if key not in self.payment_infos:
+            self.payment_infos[key] = self.substrate.get_payment_info(call=call, keypair=self.keypair)
+
+        return self.payment_infos[key]
+
+    #
+    # estimate_fees - Get the expected fee (partialFee) of each of the given calls.
+    #
+    def estimate_fees(self, calls):
+        return [self.payment_info(call)['partialFee'] for call in calls]
+
+    #
+    # has_funds - Check the account can pay the given fees and still keep the existential deposit.
+    #
+    def has_funds(self, fees):
+        return (self.free_balance - fees) >= self.existential_deposit
+
+    #
+    # sign - Sign a call with the next nonce of the account, returning the extrinsic to submit.
+    #
+    def sign(self, call, expected_fee):
+        with PROFILER.phase('pay: sign'):
+            extrinsic = self.substrate.create_signed_extrinsic(
+                call=call,
+                keypair=self.keypair,
+                nonce=self.nonce
+            )
+
+        self.nonce += 1
+        self.free_balance -= expected_fee
+
+        return extrinsic
+
+    #
+    # send - Submit a signed extrinsic without waiting for its inclusion, returning the extrinsic hash. It can be
+    #        submitted through another connection than the one of the session (e.g. one of the RPC pool).
+    #
+    def send(self, extrinsic, substrate=None):
+        substrate = substrate if substrate is not None else self.substrate
+
+        with PROFILER.phase('pay: submit'):
+            extrinsic_receipt = substrate.submit_extrinsic(
+                extrinsic=extrinsic,
+                wait_for_inclusion=False
+            )
+
+        self.extrinsic_hashes.append(extrinsic_receipt.extrinsic_hash)
+
+        return extrinsic_receipt.extrinsic_hash
+
+    #
+    # submit - Sign and submit a call without waiting for its inclusion, returning the extrinsic hash.
+    #
+    def submit(self, call, expected_fee):
+        return self.send(self.sign(call, expected_fee))
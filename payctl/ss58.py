@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from hashlib import blake2b
+
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BASE58_INDEX = dict((char, i) for i, char in enumerate(BASE58_ALPHABET))
+
+SS58_CHECKSUM_PREFIX = b'SS58PRE'
+
+# Lengths of the public keys (sr25519/ed25519 and ecdsa) an account address can carry
+SS58_KEY_LENGTHS = [32, 33]
+
+# Registry of the SS58 address formats, the official ss58-registry.json (see scripts/update_ss58_registry.py)
+SS58_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ss58-registry.json')
+
+# Networks not on the registry (they use the format of their relay chain, or the generic one), and names
+# used by previous versions of the registry, with the format they use
+NETWORK_ALIASES = {
+    'westend': 42,
+    'rococo': 42,
+    'amber': 42,
+    'statemine': 2,
+    'statemint': 0,
+    'asset-hub-kusama': 2,
+    'asset-hub-polkadot': 0,
+    'sr25519': 1,
+    'ed25519': 3,
+    'secp256k1': 43,
+    'plasm': 5,
+    'polymath': 12,
+    'substratee': 13,
+}
+
+
+#
+# ss58_decode - Decode an SS58 address into its format (network prefix) and public key, without depending on
+#               substrate-interface. Raises ValueError when the address is not valid.
+#
+def ss58_decode(address):
+    data = base58_decode(address)
+
+    if len(data) < 1:
+        raise ValueError("empty address")
+
+    if data[0] < 64:
+        ss58_format, prefix_length = data[0], 1
+    elif data[0] < 128 and len(data) > 1:
+        ss58_format = ((data[0] & 0b0011_1111) << 2) | (data[1] >> 6) | ((data[1] & 0b0011_1111) << 8)
+        prefix_length = 2
+    else:
+        raise ValueError("invalid address prefix")
+
+    # Account addresses carry a checksum of 2 bytes
+    key_length = len(data) - prefix_length - 2
+    if key_length not in SS58_KEY_LENGTHS:
+        raise ValueError(f"invalid address length ({len(data)} bytes)")
+
+    checksum = blake2b(SS58_CHECKSUM_PREFIX + data[:-2], digest_size=64).digest()[:2]
+    if checksum != data[-2:]:
+        raise ValueError("invalid address checksum")
+
+    return ss58_format, data[prefix_length:-2]
+
+
+def base58_decode(value):
+    number = 0
+    for char in value:
+        if char not in BASE58_INDEX:
+            raise ValueError(f"invalid base58 character '{char}'")
+        number = number * 58 + BASE58_INDEX[char]
+
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+
+    # Leading zeros are encoded as leading '1's
+    return b'\x00' * (len(value) - len(value.lstrip('1'))) + data
+
+
+ss58_registry = None
+ss58_registry_lock = threading.Lock()
+
+
+#
+# get_ss58_registry - Get the registry indexed by network name (lowercase, including the aliases) and by format,
+#                     as ({network: entry}, {format: entry}). It is loaded once per process.
+#
+def get_ss58_registry():
+    global ss58_registry
+
+    with ss58_registry_lock:
+        if ss58_registry is None:
+            with open(SS58_REGISTRY_PATH) as file:
+                entries = [registry_entry(entry) for entry in json.load(file)['registry']]
+
+            formats = dict((entry['prefix'], entry) for entry in entries)
+            networks = dict((entry['network'].lower(), entry) for entry in entries)
+
+            for network, prefix in NETWORK_ALIASES.items():
+                networks.setdefault(network, dict(formats[prefix], network=network, symbol=None, decimals=None))
+
+            ss58_registry = (networks, formats)
+
+    return ss58_registry
+
+
+def registry_entry(entry):
+    return {
+        'prefix': entry['prefix'],
+        'network': entry['network'],
+        'display_name': entry['displayName'],
+        'symbol': entry['symbols'][0] if len(entry['symbols']) > 0 else None,
+        'decimals': entry['decimals'][0] if len(entry['decimals']) > 0 else None,
+    }
+
+
+#
+# get_network_info - Get the format, token symbol and decimals of a network (by name) from the registry,
+#                    None when the network is not known.
+#
+def get_network_info(network):
+    if network is None:
+        return None
+
+    return get_ss58_registry()[0].get(network.lower())
+
+
+#
+# get_format_info - Get the network using an address format from the registry, None when it is not known.
+#
+def get_format_info(ss58_format):
+    return get_ss58_registry()[1].get(ss58_format)
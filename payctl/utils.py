@@ -1,4 +1,31 @@
-from substrateinterface import Keypair
+import os
+import time
+
+# substrate-interface (and scalecodec) are imported by the helpers using them, so the commands that do not
+# connect to the chain do not pay for loading them
+
+from .cache import EraCache
+from .metrics import METRICS
+from .pool import RPCPool, run_concurrently
+from .profiling import get_rpc_trace, profiled
+from .records import EraPayout
+from .ss58 import get_network_info
+
+# Eras evaluated before the active one, unless DepthEras is set
+DEFAULT_DEPTH_ERAS = 84
+
+# Maximum number of storage keys sent on a single state_queryStorageAt request
+STORAGE_KEYS_PER_REQUEST = 256
+
+# Denominator of the Perbill type, used for reward points shares and commissions
+PERBILL = 10**9
+
+# Share of the extrinsic weight and length limits used when packing payouts, to leave room for estimation errors
+BLOCK_LIMITS_RATIO = 0.75
+
+# Blocks to wait for the inclusion of submitted extrinsics, and seconds between checks of new blocks
+INCLUSION_MAX_BLOCKS = 20
+INCLUSION_POLL_INTERVAL = 2
 
 #
 # get_config - Get a default and validator specific config elements from args and config.
@@ -14,24 +41,114 @@ def get_config(args, config, key, section='Defaults'):
 
 
 #
-# get_eras_rewards_point - Collect the ErasRewardPoints (total and invididual) for a given range of eras.
+# get_active_era - Get the index of the active era.
 #
-def get_eras_rewards_point(substrate, start, end):
-    eras_rewards_point = {}
+@profiled
+def get_active_era(substrate, block_hash=None):
+    with METRICS.timer('payctl_rpc_query_duration_seconds', endpoint=substrate.url, module='Staking', storage_function='ActiveEra'):
+        active_era = substrate.query(
+            module='Staking',
+            storage_function='ActiveEra',
+            block_hash=block_hash
+        )
+    METRICS.inc('payctl_rpc_storage_keys_total', endpoint=substrate.url, module='Staking', storage_function='ActiveEra')
+
+    return active_era.value['index']
+
 
-    for era in range(start, end):
-        reward_points = substrate.query(
+#
+# get_current_era - Get the index of the current (planned) era, which can be ahead of the active one at the era
+#                   boundaries. The claimable eras (HistoryDepth) are counted from it.
+#
+@profiled
+def get_current_era(substrate, block_hash=None):
+    with METRICS.timer('payctl_rpc_query_duration_seconds', endpoint=substrate.url, module='Staking', storage_function='CurrentEra'):
+        current_era = substrate.query(
             module='Staking',
-            storage_function='ErasRewardPoints',
-            params=[era]
+            storage_function='CurrentEra',
+            block_hash=block_hash
         )
+    METRICS.inc('payctl_rpc_storage_keys_total', endpoint=substrate.url, module='Staking', storage_function='CurrentEra')
+
+    return current_era.value
+
+
+#
+# query_storage_multi - Fetch the entries of a storage function for a list of params using multi-key
+#                       requests (state_queryStorageAt), all of them pinned to the same block hash.
+#                       Returns a dict indexed by the tuple of params of each entry.
+#
+def query_storage_multi(substrate, module, storage_function, params_list, block_hash=None, pool=None):
+    return query_storage_requests(substrate, [(module, storage_function, params_list)], block_hash, pool)[0]
+
+
+#
+# query_storage_requests - Fetch the entries of several storage functions, given as (module, storage_function,
+#                          params_list) requests, all of them pinned to the same block hash. Returns the entries
+#                          of each request, as query_storage_multi does.
+#
+#                          Requests are split in chunks of STORAGE_KEYS_PER_REQUEST keys, and the chunks of all
+#                          of them are run as a single work list on the pool (if any), so independent reads
+#                          share all its connections.
+#
+@profiled
+def query_storage_requests(substrate, requests, block_hash=None, pool=None):
+    chunks = [
+        (i, params_list[start:start + STORAGE_KEYS_PER_REQUEST])
+        for i, (module, storage_function, params_list) in enumerate(requests)
+        for start in range(0, len(params_list), STORAGE_KEYS_PER_REQUEST)
+    ]
+
+    def query(substrate, i, params_list):
+        from substrateinterface.storage import StorageKey
+
+        module, storage_function, _ = requests[i]
+
+        substrate.init_runtime(block_hash=block_hash)
+
+        # Storage keys are built locally, substrate.create_storage_key would reload the runtime on every call
+        storage_keys = [
+            StorageKey.create_from_storage_function(
+                module, storage_function, params,
+                runtime_config=substrate.runtime_config,
+                metadata=substrate.metadata
+            ) for params in params_list
+        ]
+
+        labels = {'endpoint': substrate.url, 'module': module, 'storage_function': storage_function}
+
+        with METRICS.timer('payctl_rpc_query_duration_seconds', **labels):
+            values = substrate.query_multi(storage_keys, block_hash)
+        METRICS.inc('payctl_rpc_storage_keys_total', len(storage_keys), **labels)
+
+        return i, values
+
+    results = [{} for _ in requests]
+
+    for i, values in run_concurrently(substrate, pool, [
+        lambda substrate, chunk=chunk: query(substrate, *chunk) for chunk in chunks
+    ]):
+        for storage_key, value in values:
+            results[i][tuple(storage_key.params)] = value
+
+    return results
+
 
+#
+# decode_eras_rewards_point - Decode the ErasRewardPoints (total and invididual) of a list of eras.
+#
+def decode_eras_rewards_point(eras, reward_points):
+    eras_rewards_point = {}
+
+    for era in eras:
         try:
+            value = reward_points[(era,)].value
+
             eras_rewards_point[era] = {}
-            eras_rewards_point[era]['total'] = reward_points.value['total']
+            eras_rewards_point[era]['total'] = value['total']
             eras_rewards_point[era]['individual'] = {}
 
-            for reward_points_item in reward_points.value['individual']:
+            for reward_points_item in value['individual']:
                 eras_rewards_point[era]['individual'][reward_points_item[0]] = reward_points_item[1]
         except:
             continue
@@ -40,108 +157,251 @@ def get_eras_rewards_point(substrate, start, end):
 
 
 #
-# get_eras_validator_rewards - Collect the ErasValidatorReward for a given range of eras.
+# decode_eras_validator_rewards - Decode the ErasValidatorReward of a list of eras.
 #
-def get_eras_validator_rewards(substrate, start, end):
+def decode_eras_validator_rewards(eras, validator_rewards):
     eras_validator_rewards = {}
 
-    for era in range(start, end):
-        validator_rewards = substrate.query(
-            module='Staking',
-            storage_function='ErasValidatorReward',
-            params=[era]
-        )
-
+    for era in eras:
         try:
-            eras_validator_rewards[era] = validator_rewards.value
+            # Eras without reward yet (or already pruned) are decoded as None
+            if validator_rewards[(era,)].value is None:
+                continue
+
+            eras_validator_rewards[era] = validator_rewards[(era,)].value
         except:
             continue
 
     return eras_validator_rewards
 
+
 #
-# get_eras_claims - Collect the ClaimedRewards for a given range of eras.
+# get_eras_claims - Collect the ClaimedRewards for a given list of (era, stash) pairs, looked up directly by
+#                   their double map key. Returns the claimed pages as {(era, stash): set(page)}, only for
+#                   the pairs with at least one page claimed.
 #
-def get_eras_claims(substrate, start, end):
-    eras_claims = {}
+@profiled
+def get_eras_claims(substrate, pairs, block_hash=None, pool=None):
+    return decode_eras_claims(query_storage_multi(
+        substrate, 'Staking', 'ClaimedRewards', [[era, stash] for era, stash in pairs], block_hash, pool
+    ))
 
-    for era in range(start, end):
-        claims = substrate.query_map(
-            module='Staking',
-            storage_function='ClaimedRewards',
-            params=[era]
-        )
 
-        # Extract the list of validators who claimed a reward in this era
-        validators = list(map(lambda x: x[0].value, claims))
+#
+# decode_eras_claims - Decode the ClaimedRewards entries, see get_eras_claims.
+#
+def decode_eras_claims(claims):
+    return dict(((era, stash), set(pages.value)) for (era, stash), pages in claims.items() if pages.value)
 
-        eras_claims[era] = validators
 
-    return eras_claims
+#
+# get_eras_page_counts - Collect the number of exposure pages (ErasStakersOverview) for a given list of
+#                        (era, stash) pairs, as {(era, stash): page_count}. Every validator has at least
+#                        one page to be paid, also in eras previous to paged exposures.
+#
+@profiled
+def get_eras_page_counts(substrate, pairs, block_hash=None, pool=None):
+    paged = has_paged_exposures(substrate, block_hash)
+
+    overviews = query_storage_multi(
+        substrate, 'Staking', 'ErasStakersOverview', [[era, stash] for era, stash in pairs] if paged else [],
+        block_hash, pool
+    )
+
+    return decode_eras_page_counts(pairs, overviews, paged)
 
 
 #
-# get_eras_payment_info - Combine information from ErasRewardPoints and ErasValidatorReward for given
-#                         range of eras to repor the amount of per validator instead of era points.
+# decode_eras_page_counts - Decode the ErasStakersOverview entries of the given pairs, see get_eras_page_counts.
 #
-def get_eras_payment_info(substrate, start, end):
-    eras_rewards_point = get_eras_rewards_point(substrate, start, end)
-    eras_validator_rewards = get_eras_validator_rewards(substrate, start, end)
+def decode_eras_page_counts(pairs, overviews, paged):
+    # Runtimes without paged exposures pay every validator in a single call
+    if not paged:
+        return dict((pair, 1) for pair in pairs)
 
-    eras_payment_info = {}
+    page_counts = {}
+    for (era, stash), overview in overviews.items():
+        page_count = overview.value['page_count'] if overview.value is not None else 1
+        page_counts[(era, stash)] = max(page_count, 1)
+
+    return page_counts
+
+
+#
+# has_paged_exposures - Check if the runtime keeps the exposures by page (ErasStakersOverview).
+#
+def has_paged_exposures(substrate, block_hash=None):
+    return substrate.get_metadata_storage_function('Staking', 'ErasStakersOverview', block_hash) is not None
+
+
+#
+# get_eras_rewards - Collect the ErasRewardPoints and ErasValidatorReward for given range of eras, as
+#                    {era: {'total', 'individual', 'reward'}}, only for the eras with rewards.
+#
+#                    When a cache is given, only the eras not cached yet are fetched from the chain.
+#
+@profiled
+def get_eras_rewards(substrate, start, end, block_hash=None, cache=None, pool=None):
+    eras_rewards, requests = get_eras_rewards_requests(start, end, cache)
+
+    return decode_eras_rewards(eras_rewards, *query_storage_requests(substrate, requests, block_hash, pool), cache)
+
+
+#
+# get_eras_rewards_requests - Get the cached rewards of the given range of eras, and the storage requests (see
+#                             query_storage_requests) of the ErasRewardPoints and ErasValidatorReward of the rest.
+#
+def get_eras_rewards_requests(start, end, cache=None):
+    cached_eras = cache.get_eras(range(start, end)) if cache is not None else {}
+    missing_eras = [era for era in range(start, end) if era not in cached_eras]
+
+    return cached_eras, [
+        ('Staking', 'ErasRewardPoints', [[era] for era in missing_eras]),
+        ('Staking', 'ErasValidatorReward', [[era] for era in missing_eras]),
+    ]
+
+
+#
+# decode_eras_rewards - Add the eras with rewards of the entries read for the requests of get_eras_rewards_requests
+#                       to the given eras rewards, caching them.
+#
+def decode_eras_rewards(eras_rewards, reward_points, validator_rewards, cache=None):
+    eras = [era for era, in reward_points.keys()]
+
+    eras_rewards_point = decode_eras_rewards_point(eras, reward_points)
+    eras_validator_rewards = decode_eras_validator_rewards(eras, validator_rewards)
 
     # era indexes with rewards points and validator rewards
     eras = list(set(eras_rewards_point.keys()) & set(eras_validator_rewards.keys()))
 
     for era in eras:
-        total_points = eras_rewards_point[era]['total']
+        if eras_rewards_point[era]['total'] == 0:
+            continue
+
+        eras_rewards[era] = {
+            'total': eras_rewards_point[era]['total'],
+            'individual': eras_rewards_point[era]['individual'],
+            'reward': eras_validator_rewards[era],
+        }
+
+        # Finished eras are immutable
+        if cache is not None:
+            cache.set_era(era, eras_rewards[era]['total'], eras_rewards[era]['individual'], eras_rewards[era]['reward'])
+
+    return eras_rewards
+
+
+#
+# get_eras_payment_info - Combine information from ErasRewardPoints and ErasValidatorReward for given
+#                         range of eras to repor the amount of per validator instead of era points.
+#
+#                         Amounts are integer planck, computed only for the given accounts when there are.
+#
+@profiled
+def get_eras_payment_info(substrate, start, end, accounts=None, block_hash=None, cache=None, pool=None):
+    return get_eras_payment_amounts(get_eras_rewards(substrate, start, end, block_hash, cache, pool), accounts)
+
+
+#
+# get_eras_payment_amounts - Compute the payment info of get_eras_payment_info from the eras rewards.
+#
+def get_eras_payment_amounts(eras_rewards, accounts=None):
+    eras_payment_info = {}
 
-        for validatorId in eras_rewards_point[era]['individual']:
-            total_reward = eras_validator_rewards[era]
-            eras_rewards_point[era]['individual'][validatorId] *= (total_reward/total_points)
+    for era in eras_rewards:
+        total_points = eras_rewards[era]['total']
+        total_reward = eras_rewards[era]['reward']
+        individual = eras_rewards[era]['individual']
 
-        eras_payment_info[era] = eras_rewards_point[era]['individual']
+        validators = individual.keys() if accounts is None else [a for a in accounts if a in individual]
+
+        # Same rounding as the runtime payout
+        eras_payment_info[era] = dict(
+            (validatorId, perbill_mul(perbill_from_rational(individual[validatorId], total_points), total_reward))
+            for validatorId in validators
+        )
 
     return eras_payment_info
 
+
 #
 # get_eras_payment_info_filtered - Similar than get_eras_payment_info but applying some filters;
 #                                  1 . Include only eras containing given acconts.
 #                                  2 . Include only eras containing unclaimed rewards.
 #
+#                                  Each account reports the exposure pages still pending to be paid.
+#
 #                                  NOTE: The returned structure is slighly different than
-#                                        get_eras_payment_info
+#                                        get_eras_payment_info, {era: {stash: EraPayout}}
 #
-def get_eras_payment_info_filtered(substrate, start, end, accounts=[], only_unclaimed=False):
+@profiled
+def get_eras_payment_info_filtered(substrate, start, end, accounts=[], only_unclaimed=False, block_hash=None,
+                                   cache=None, pool=None):
     eras_payment_info_filtered = {}
 
-    eras_payment_info = get_eras_payment_info(substrate, start, end)
-    # get_accounts_ledger relies on a deprecated API that may stop working at some point
-    accounts_ledger = get_accounts_ledger(substrate, accounts)
-    # get_eras_claims replaces the previous call with a newer API
-    claims = get_eras_claims(substrate, start, end)
+    if cache is not None:
+        claims = cache.get_claims(range(start, end))
+        page_counts = cache.get_page_counts(range(start, end))
+    else:
+        claims = {}
+        page_counts = {}
+
+    pairs = [(era, accountId) for era in range(start, end) for accountId in accounts]
+
+    # Claimed pages are only ever added, so only the pairs not known as fully claimed are checked on-chain
+    unknown_claims = [
+        pair for pair in pairs
+        if pair not in page_counts or len(claims.get(pair, set())) < page_counts[pair]
+    ]
+    unknown_page_counts = [pair for pair in pairs if pair not in page_counts]
+
+    paged = has_paged_exposures(substrate, block_hash)
+
+    eras_rewards, eras_rewards_requests = get_eras_rewards_requests(start, end, cache)
+
+    # The era, ledger and claim reads are independent, all their chunks are run as one work list on the pool
+    reward_points, validator_rewards, bonded, claimed_rewards, overviews = query_storage_requests(substrate, [
+        *eras_rewards_requests,
+        # Bonded (and Ledger) rely on a deprecated API that may stop working at some point
+        ('Staking', 'Bonded', [[account] for account in accounts]),
+        # ClaimedRewards replaces the previous call with a newer API
+        ('Staking', 'ClaimedRewards', [[era, stash] for era, stash in unknown_claims]),
+        ('Staking', 'ErasStakersOverview', [[era, stash] for era, stash in unknown_page_counts] if paged else []),
+    ], block_hash, pool)
+
+    eras_payment_info = get_eras_payment_amounts(
+        decode_eras_rewards(eras_rewards, reward_points, validator_rewards, cache), accounts
+    )
+    accounts_ledger = get_bonded_ledger(substrate, accounts, bonded, block_hash, pool)
+    new_claims = decode_eras_claims(claimed_rewards)
+    new_page_counts = decode_eras_page_counts(unknown_page_counts, overviews, paged)
+
+    for pair, pages in new_claims.items():
+        claims.setdefault(pair, set()).update(pages)
+    page_counts.update(new_page_counts)
+
+    if cache is not None:
+        cache.add_claims(new_claims)
+        cache.set_page_counts(new_page_counts)
 
     for era in eras_payment_info:
         for accountId in accounts:
             if accountId in eras_payment_info[era]:
-                if era in accounts_ledger[accountId]['legacy_claimed_rewards'] or accountId in claims[era]:
-                    claimed = True
+                page_count = page_counts[(era, accountId)]
+
+                # Eras claimed with the legacy (non paged) payout have all the pages claimed
+                if era in accounts_ledger[accountId]['legacy_claimed_rewards']:
+                    pages = []
                 else:
-                    claimed = False
+                    pages = [page for page in range(page_count) if page not in claims.get((era, accountId), set())]
+
+                payout = EraPayout(era, accountId, eras_payment_info[era][accountId], pages, page_count)
 
                 # if we only want the unclaimed rewards, skip
-                if claimed and only_unclaimed:
+                if payout.claimed and only_unclaimed:
                     continue
 
-                if era not in eras_payment_info_filtered:
-                    eras_payment_info_filtered[era] = {}
-
-                eras_payment_info_filtered[era][accountId] = {}
-
-                amount = eras_payment_info[era][accountId] / (10**substrate.token_decimals)
-
-                eras_payment_info_filtered[era][accountId]['claimed'] = claimed
-                eras_payment_info_filtered[era][accountId]['amount'] = amount
+                eras_payment_info_filtered.setdefault(era, {})[accountId] = payout
 
     return eras_payment_info_filtered
 
@@ -156,59 +416,255 @@ def get_included_accounts(args, config):
     return [section for section in config.sections() if section != "Defaults"]
 
 
+#
+# get_substrate - Open the connection to the (first) RPC URL of the config, or to the given one.
+#
+def get_substrate(args, config, url=None):
+    return connect_substrate(
+        url if url is not None else get_rpc_urls(args, config)[0],
+        get_config(args, config, 'network'),
+        cache_dir=get_cache_dir(args, config),
+        rpc_trace=get_rpc_trace(args.tracerpc) if vars(args).get('tracerpc') is not None else None
+    )
+
 
 #
-# get_accounts_ledger - Collect the Ledger for a given list of accounts.
+# connect_substrate - Open a connection to an RPC URL of a network, caching its metadata and properties in
+#                     'cache_dir' when given.
 #
-def get_accounts_ledger(substrate, accounts):
+@profiled
+def connect_substrate(url, network, cache_dir=None, rpc_trace=None):
+    from .metadata import CachedSubstrateInterface
+
+    return CachedSubstrateInterface(
+        url=url,
+        type_registry_preset=get_type_preset(network),
+        network_info=get_network_info(network),
+        cache_dir=cache_dir,
+        rpc_trace=rpc_trace
+    )
+
+
+#
+# get_rpc_urls - Get the list of RPC URLs, several ones can be given separated by commas.
+#
+def get_rpc_urls(args, config):
+    return [url.strip() for url in get_config(args, config, 'rpcurl').split(',') if url.strip() != '']
+
+
+#
+# get_rpc_pool - Create the pool of connections used to run the RPC requests concurrently.
+#
+def get_rpc_pool(args, config, substrate):
+    concurrency = get_config(args, config, 'concurrency')
+    concurrency = int(concurrency) if concurrency is not None else 1
+
+    return RPCPool(
+        get_rpc_urls(args, config),
+        lambda url: get_substrate(args, config, url),
+        size=concurrency,
+        substrate=substrate
+    )
+
+
+#
+# get_era_window - Get the window of eras to evaluate (the last DepthEras before the active era) as of the
+#                  finalized head, as (block_hash, active_era, history_depth, eras). All the reads of a run are
+#                  pinned to that block, so they stay consistent if an era boundary passes mid-run. The eras
+#                  before the window are pruned from the given era cache.
+#
+def get_era_window(args, config, substrate, cache=None):
+    block_hash = substrate.get_chain_finalised_head()
+
+    active_era = get_active_era(substrate, block_hash)
+    history_depth = get_history_depth(substrate, block_hash=block_hash)
+
+    depth = get_config(args, config, 'deptheras')
+    depth = int(depth) if depth is not None else DEFAULT_DEPTH_ERAS
+
+    eras = range(active_era - depth, active_era)
+
+    if cache is not None:
+        cache.prune(eras.start)
+
+    return block_hash, active_era, history_depth, eras
+
+
+#
+# get_era_cache - Open the on-disk era cache for the connected network, unless disabled.
+#
+def get_era_cache(args, config, substrate):
+    cache_dir = get_cache_dir(args, config)
+    if cache_dir is None:
+        return None
+
+    return EraCache(
+        os.path.join(cache_dir, 'eras.sqlite'),
+        get_config(args, config, 'network'),
+        substrate.genesis_hash
+    )
+
+
+#
+# get_cache_dir - Get the directory of the era and metadata caches, None if caching is disabled.
+#
+def get_cache_dir(args, config):
+    if vars(args).get('no_cache'):
+        return None
+
+    cache_dir = get_config(args, config, 'cachedir')
+
+    return os.path.expanduser(cache_dir if cache_dir is not None else '~/.cache/payctl')
+
+
+
+#
+# perbill_from_rational - Perbill::from_rational(p, q) as computed by the runtime, rounding down.
+#
+def perbill_from_rational(p, q):
+    if p >= q:
+        return PERBILL
+
+    return p * PERBILL // q
+
+
+#
+# perbill_mul - Perbill * n as computed by the runtime, rounding to the nearest (half down).
+#
+def perbill_mul(parts, n):
+    quotient, remainder = divmod(n, PERBILL)
+    correction, correction_remainder = divmod(remainder * parts, PERBILL)
+
+    return quotient * parts + correction + (1 if correction_remainder * 2 > PERBILL else 0)
+
+
+#
+# get_accounts_ledger - Collect the Ledger for a given list of accounts, indexed by stash.
+#
+#                       Bonded is fetched for all the stashes in one multi-key read, and then the Ledger of
+#                       the (deduplicated) controllers in a second one. The legacy claimed rewards are
+#                       returned as a set of eras.
+#
+@profiled
+def get_accounts_ledger(substrate, accounts, block_hash=None, pool=None):
+    bonded = query_storage_multi(
+        substrate, 'Staking', 'Bonded', [[account] for account in accounts], block_hash, pool
+    )
+
+    return get_bonded_ledger(substrate, accounts, bonded, block_hash, pool)
+
+
+#
+# get_bonded_ledger - Collect the Ledger for a given list of accounts, given the entries of their Bonded.
+#
+def get_bonded_ledger(substrate, accounts, bonded, block_hash=None, pool=None):
+    controllers = {}
+    for account in accounts:
+        if (account,) in bonded and bonded[(account,)].value is not None:
+            controllers[account] = bonded[(account,)].value
+
+    ledgers = query_storage_multi(
+        substrate, 'Staking', 'Ledger', [[controller] for controller in set(controllers.values())], block_hash, pool
+    )
+
     accounts_ledger = {}
 
     for account in accounts:
-        try:
-            controller_account = substrate.query(
-                module='Staking',
-                storage_function='Bonded',
-                params=[accounts[0]]
-            )
-
-            ledger = substrate.query(
-                module='Staking',
-                storage_function='Ledger',
-                params=[controller_account.value]
-            )
-
-            accounts_ledger[account] = ledger.value
-        except:
-            continue
+        ledger = {}
+        if account in controllers and (controllers[account],) in ledgers:
+            ledger = ledgers[(controllers[account],)].value or {}
+
+        # Older runtimes name the field claimed_rewards
+        legacy_claimed_rewards = ledger.get('legacy_claimed_rewards', ledger.get('claimed_rewards', []))
+
+        accounts_ledger[account] = dict(ledger)
+        accounts_ledger[account]['legacy_claimed_rewards'] = set(legacy_claimed_rewards)
 
     return accounts_ledger
 
 
 #
-# get_keypair - Generate a Keypair from args and config.
+# get_keypair - Generate a Keypair from args and config, the one of the first signing lane (see get_keypairs).
+#
+def get_keypair(args, config, substrate=None):
+    keypairs = get_keypairs(args, config, substrate)
+
+    return keypairs[0] if len(keypairs) > 0 else None
+
+
+#
+# has_signing_key - Check whether a signing key (SigningSeed, SigningMnemonic or SigningUri) is given, without
+#                   generating it. Empty values (as in the config template) are not keys.
+#
+def has_signing_key(args, config):
+    return any(get_config(args, config, key) not in [None, ''] for key in ['signingseed', 'signingmnemonic', 'signinguri'])
+
+
+#
+# get_keypairs - Generate the Keypairs of the signing lanes from args and config. SigningSeed, SigningMnemonic
+#                and SigningUri accept several keys, one per line, each one signing on its own account (lane).
 #
-def get_keypair(args, config):
+def get_keypairs(args, config, substrate=None):
+    from substrateinterface import Keypair
+
     signingseed = get_config(args, config, 'signingseed')
     signingmnemonic = get_config(args, config, 'signingmnemonic')
     signinguri = get_config(args, config, 'signinguri')
     
-    ss58_format = get_ss58_address_format(get_config(args, config, 'network'))
-
-    if signingseed is not None:
-        keypair = Keypair.create_from_seed(signingseed, ss58_format)
-    elif signingmnemonic is not None:
-        keypair = Keypair.create_from_mnemonic(signingmnemonic, ss58_format)
-    elif signinguri is not None:
-        keypair = Keypair.create_from_uri(signinguri, ss58_format)
+    # The format of the connected chain is preferred, the one of the network otherwise
+    ss58_format = substrate.ss58_format if substrate is not None else None
+    if ss58_format is None:
+        ss58_format = get_ss58_address_format(get_config(args, config, 'network'))
+    if ss58_format is None:
+        ss58_format = 42
+
+    if signingseed not in [None, '']:
+        keypairs = [Keypair.create_from_seed(seed, ss58_format) for seed in get_config_lines(signingseed)]
+    elif signingmnemonic not in [None, '']:
+        keypairs = [Keypair.create_from_mnemonic(mnemonic, ss58_format) for mnemonic in get_config_lines(signingmnemonic)]
+    elif signinguri not in [None, '']:
+        keypairs = [Keypair.create_from_uri(uri, ss58_format) for uri in get_config_lines(signinguri)]
     else:
-        keypair = None
+        keypairs = []
 
-    return keypair
+    return keypairs
+
+
+#
+# get_signing_lanes - Get the (keypair, account) of each signing lane. The account of a single lane is SigningAccount,
+#                     the accounts of several lanes are the ones of their keys.
+#
+def get_signing_lanes(args, config, substrate=None):
+    keypairs = get_keypairs(args, config, substrate)
+
+    signing_account = get_config(args, config, 'signingaccount')
+    if len(keypairs) == 1 and signing_account not in [None, '']:
+        return [(keypairs[0], signing_account)]
+
+    return [(keypair, keypair.ss58_address) for keypair in keypairs]
+
+
+#
+# get_config_lines - Split a multi-line config value in its non empty lines.
+#
+def get_config_lines(value):
+    return [line.strip() for line in value.splitlines() if line.strip() != '']
+
+
+#
+# get_account_keypair - Get a keypair of an account without its secret, which can not sign but is enough to
+#                       estimate fees, so payouts can be planned on a host without the signing key.
+#
+def get_account_keypair(substrate, account):
+    from substrateinterface import Keypair
+
+    return Keypair(ss58_address=account, ss58_format=substrate.ss58_format)
 
 
 #
 # get_account_info - Get the account info, including nonce and balance, for a given account.
 #
+@profiled
 def get_account_info(substrate, account):
     account_info = substrate.query(
         module='System',
@@ -219,108 +675,259 @@ def get_account_info(substrate, account):
     return account_info.value
 
 
+#
+# get_constants_index - Get all the metadata constants indexed by (module name, constant name).
+#
+@profiled
+def get_constants_index(substrate, block_hash=None):
+    constants = {}
+
+    for c in substrate.get_metadata_constants(block_hash):
+        constants[(c['module_name'], c['constant_name'])] = c.get('constant_value')
+
+    return constants
+
+
 #
 # get_existential_deposit - Get the existential_deposit, the minimum amount required to keep an account open.
 #
-def get_existential_deposit(substrate):
-    constants = substrate.get_metadata_constants()
-    existential_deposit = 0
+def get_existential_deposit(substrate, constants=None):
+    if constants is None:
+        constants = get_constants_index(substrate)
 
-    for c in constants:
-        if c['constant_name'] == 'ExistentialDeposit':
-            existential_deposit = c.get('constant_value', 0)
-    
-    return existential_deposit
+    existential_deposit = constants.get(('Balances', 'ExistentialDeposit'))
+
+    return existential_deposit if existential_deposit is not None else 0
+
+
+#
+# get_history_depth - Get the number of eras the rewards can be claimed for. It is a constant on recent
+#                     runtimes, and a storage value on older ones.
+#
+@profiled
+def get_history_depth(substrate, constants=None, block_hash=None):
+    if constants is None:
+        constants = get_constants_index(substrate, block_hash)
+
+    history_depth = constants.get(('Staking', 'HistoryDepth'))
+    if history_depth is not None:
+        return history_depth
+
+    if substrate.get_metadata_storage_function('Staking', 'HistoryDepth', block_hash) is None:
+        return None
+
+    return substrate.query(module='Staking', storage_function='HistoryDepth', block_hash=block_hash).value
+
+
+#
+# get_block_limits - Get the maximum weight (ref_time, proof_size) and length of a normal extrinsic.
+#
+@profiled
+def get_block_limits(substrate, constants=None):
+    if constants is None:
+        constants = get_constants_index(substrate)
+
+    block_weights = constants[('System', 'BlockWeights')]
+    block_length = constants[('System', 'BlockLength')]
+
+    max_weight = block_weights['per_class']['normal']['max_extrinsic']
+    if max_weight is None:
+        max_weight = block_weights['max_block']
+
+    ref_time, proof_size = get_weight(max_weight)
+
+    return {
+        'ref_time': int(ref_time * BLOCK_LIMITS_RATIO),
+        'proof_size': int(proof_size * BLOCK_LIMITS_RATIO),
+        'length': int(block_length['max']['normal'] * BLOCK_LIMITS_RATIO),
+    }
+
+
+#
+# get_weight - Get a weight as a (ref_time, proof_size) tuple, for both V1 (integer) and V2 weights.
+#
+def get_weight(weight):
+    if isinstance(weight, dict):
+        return weight['ref_time'], weight.get('proof_size', 0)
+
+    return weight, 0
+
+
+#
+# compose_batch - Compose the call that batches the given calls with the given Utility function.
+#
+def compose_batch(substrate, calls, batch_function, block_hash=None):
+    # Batching a single call only adds overhead
+    if len(calls) == 1:
+        return calls[0]
+
+    return substrate.compose_call(
+        call_module='Utility',
+        call_function=batch_function,
+        call_params={
+            'calls': calls
+        },
+        block_hash=block_hash
+    )
+
+
+#
+# compose_payout_calls - Compose the payout call of each [era, stash, page] payout, by page unless page is None.
+#                        Given a block hash, the runtime is only loaded once for all of them.
+#
+def compose_payout_calls(substrate, payouts, block_hash=None):
+    calls = []
+
+    for era, stash, page in payouts:
+        if page is not None:
+            calls.append(substrate.compose_call(
+                call_module='Staking',
+                call_function='payout_stakers_by_page',
+                call_params={
+                    'validator_stash': stash,
+                    'era': era,
+                    'page': page,
+                },
+                block_hash=block_hash
+            ))
+        else:
+            calls.append(substrate.compose_call(
+                call_module='Staking',
+                call_function='payout_stakers',
+                call_params={
+                    'validator_stash': stash,
+                    'era': era,
+                },
+                block_hash=block_hash
+            ))
+
+    return calls
+
+
+#
+# plan_payout_batches - Split the payout calls in groups small enough to fit the weight and length limits of
+#                       one extrinsic, using the weights estimated by get_payment_info (or the given
+#                       payment_info function). Batches are composed with the runtime of the given block.
+#
+@profiled
+def plan_payout_batches(substrate, calls, keypair, batch_function, constants=None, payment_info=None, block_hash=None):
+    if batch_function is None:
+        return [[call] for call in calls]
+
+    if payment_info is None:
+        payment_info = lambda call: substrate.get_payment_info(call=call, keypair=keypair)
+
+    limits = get_block_limits(substrate, constants)
+
+    def fits(ref_time, proof_size, length):
+        return ref_time <= limits['ref_time'] and proof_size <= limits['proof_size'] and length <= limits['length']
+
+    # A single estimation is enough in the usual case where everything fits in one extrinsic
+    batch_info = payment_info(compose_batch(substrate, calls, batch_function, block_hash))
+    if fits(*get_weight(batch_info['weight']), sum(call.data.length for call in calls)):
+        return [calls]
+
+    # The declared weight of a payout call does not depend on its arguments, so it is estimated once per function
+    weights = {}
+    for call in calls:
+        if call.value['call_function'] not in weights:
+            weights[call.value['call_function']] = get_weight(payment_info(call)['weight'])
+
+    batches = []
+    batch, batch_ref_time, batch_proof_size, batch_length = [], 0, 0, 0
+
+    for call in calls:
+        ref_time, proof_size = weights[call.value['call_function']]
+        length = call.data.length
+
+        if len(batch) > 0 and not fits(batch_ref_time + ref_time, batch_proof_size + proof_size, batch_length + length):
+            batches.append(batch)
+            batch, batch_ref_time, batch_proof_size, batch_length = [], 0, 0, 0
+
+        batch.append(call)
+        batch_ref_time += ref_time
+        batch_proof_size += proof_size
+        batch_length += length
+
+    if len(batch) > 0:
+        batches.append(batch)
+
+    return batches
+
+
+#
+# wait_for_extrinsics - Wait for the inclusion of the given submitted extrinsics, scanning the blocks after
+#                       the given block number. Returns the receipts of the included extrinsics, in the same
+#                       order, or None for the ones not included after INCLUSION_MAX_BLOCKS blocks.
+#
+@profiled
+def wait_for_extrinsics(substrate, extrinsic_hashes, from_block):
+    from substrateinterface import ExtrinsicReceipt
+
+    pending = dict((extrinsic_hash, i) for i, extrinsic_hash in enumerate(extrinsic_hashes))
+    receipts = [None] * len(extrinsic_hashes)
+
+    block_number = from_block + 1
+
+    while len(pending) > 0 and block_number <= from_block + INCLUSION_MAX_BLOCKS:
+        if substrate.get_block_number(substrate.get_chain_head()) < block_number:
+            time.sleep(INCLUSION_POLL_INTERVAL)
+            continue
+
+        block = substrate.get_block(block_number=block_number, ignore_decoding_errors=True)
+
+        for extrinsic in block['extrinsics']:
+            if extrinsic is None or extrinsic.extrinsic_hash is None:
+                continue
+
+            extrinsic_hash = f"0x{extrinsic.extrinsic_hash.hex()}"
+            if extrinsic_hash in pending:
+                receipts[pending.pop(extrinsic_hash)] = ExtrinsicReceipt(
+                    substrate=substrate,
+                    extrinsic_hash=extrinsic_hash,
+                    block_hash=block['header']['hash'],
+                    block_number=block_number
+                )
+
+        block_number += 1
+
+    return receipts
 
 
 #
 # format_balance_to_symbol - Formats a balance in the base decimals of the chain
 #
 def format_balance_to_symbol(substrate, amount, amount_decimals=0):
-    formatted = amount / 10 ** (substrate.token_decimals - amount_decimals)
-    formatted = "{:.{}f}".format(formatted, substrate.token_decimals)
+    if isinstance(amount, int) and amount_decimals == 0:
+        # Exact formatting of planck amounts, floats lose precision on large balances
+        integer, fraction = divmod(amount, 10 ** substrate.token_decimals)
+        formatted = f"{integer}.{fraction:0{substrate.token_decimals}d}" if substrate.token_decimals > 0 else str(integer)
+    else:
+        formatted = amount / 10 ** (substrate.token_decimals - amount_decimals)
+        formatted = "{:.{}f}".format(formatted, substrate.token_decimals)
 
     # expected format -> 5.780520362127 KSM
     return f"{formatted} {substrate.token_symbol}"
 
 
 #
-# get_ss58_address_format - Gets the SS58 address format depending on the network
-# 
+# get_ss58_address_format - Gets the SS58 address format depending on the network, from the registry of
+#                           address formats (None for unknown networks).
+#
 def get_ss58_address_format(network):
-    network = network.lower()
-
-    if network == "polkadot": return 0
-    if network == "sr25519": return 1
-    if network == "kusama": return 2
-    if network == "ed25519": return 3
-    if network == "katalchain": return 4
-    if network == "plasm": return 5
-    if network == "bifrost": return 6
-    if network == "edgeware": return 7
-    if network == "karura": return 8
-    if network == "reynolds": return 9
-    if network == "acala": return 10
-    if network == "laminar": return 11
-    if network == "polymath": return 12
-    if network == "substratee": return 13
-    if network == "totem": return 14
-    if network == "synesthesia": return 15
-    if network == "kulupu": return 16
-    if network == "dark": return 17
-    if network == "darwinia": return 18
-    if network == "geek": return 19
-    if network == "stafi": return 20
-    if network == "dock-testnet": return 21
-    if network == "dock-mainnet": return 22
-    if network == "shift": return 23
-    if network == "zero": return 24
-    if network == "alphaville": return 25
-    if network == "jupiter": return 26
-    if network == "subsocial": return 28
-    if network == "cord": return 29
-    if network == "phala": return 30
-    if network == "litentry": return 31
-    if network == "robonomics": return 32
-    if network == "datahighway": return 33
-    if network == "ares": return 34
-    if network == "vln": return 35
-    if network == "centrifuge": return 36
-    if network == "nodle": return 37
-    if network == "kilt": return 38
-    if network == "poli": return 41
-    if network == "substrate": return 42
-    if network == "westend": return 42
-    if network == "amber": return 42
-    if network == "secp256k1": return 43
-    if network == "chainx": return 44
-    if network == "uniarts": return 45
-    if network == "reserved46": return 46
-    if network == "reserved47": return 47
-    if network == "neatcoin": return 48
-    if network == "hydradx": return 63
-    if network == "aventus": return 65
-    if network == "crust": return 66
-    if network == "equilibrium": return 67
-    if network == "sora": return 69
-    if network == "social-network": return 252
-        
-    return 42
-
-#
-# get_type_preset - Gets the type preset for the network
-# 
+    network_info = get_network_info(network)
+
+    return network_info['prefix'] if network_info is not None else None
+
+
+#
+# get_type_preset - Gets the type preset for the network, among the ones shipped with scalecodec.
+#
 def get_type_preset(network):
-    supported_networks = [
-        "polkadot",
-        "kusama",
-        "rococo",
-        "westend",
-        "statemine",
-        "statemint",
-    ]
+    from scalecodec.type_registry import SUPPORTED_TYPE_REGISTRY_PRESETS
 
-    if network in supported_networks:
-        return network
-    else:
-        return "default"
+    # Presets that are not networks, but the base types of all of them
+    if network is not None and network.lower() in SUPPORTED_TYPE_REGISTRY_PRESETS and network.lower() not in ['core', 'legacy', 'test']:
+        return network.lower()
+
+    return "default"
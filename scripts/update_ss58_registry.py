@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+# Regenerate payctl/data/ss58-registry.json from the official ss58-registry, the file is written unmodified.
+# With --check, only report whether the bundled registry differs from the upstream one (exit status 1).
+#
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from urllib.error import URLError
+from urllib.request import urlopen
+
+
+UPSTREAM_URL = 'https://raw.githubusercontent.com/paritytech/ss58-registry/main/ss58-registry.json'
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'payctl', 'data', 'ss58-registry.json')
+
+# Formats the aliases of payctl/ss58.py point to, they must be on the registry
+ALIAS_FORMATS = [0, 1, 2, 3, 5, 12, 13, 42, 43]
+
+
+#
+# validate_registry - Check the registry has the schema payctl relies on, returning the list of problems.
+#
+def validate_registry(content):
+    try:
+        registry = json.loads(content)['registry']
+    except (ValueError, KeyError, TypeError) as exc:
+        return [f"not a registry ({str(exc)})"]
+
+    problems = []
+    prefixes = set()
+    networks = set()
+
+    for entry in registry:
+        try:
+            prefix, network, symbols, decimals = entry['prefix'], entry['network'], entry['symbols'], entry['decimals']
+            entry['displayName']
+        except (KeyError, TypeError):
+            problems.append(f"invalid entry {entry}")
+            continue
+
+        if not isinstance(prefix, int) or not isinstance(network, str):
+            problems.append(f"invalid prefix or network on entry {entry}")
+        if not isinstance(symbols, list) or not isinstance(decimals, list) or len(symbols) != len(decimals):
+            problems.append(f"symbols and decimals of {network} do not match")
+        if prefix in prefixes:
+            problems.append(f"duplicated prefix {prefix}")
+        if str(network).lower() in networks:
+            problems.append(f"duplicated network {network}")
+
+        prefixes.add(prefix)
+        networks.add(str(network).lower())
+
+    for prefix in ALIAS_FORMATS:
+        if prefix not in prefixes:
+            problems.append(f"missing prefix {prefix}, used by the network aliases")
+
+    return problems
+
+
+def main():
+    args_parser = ArgumentParser(prog='update_ss58_registry')
+    args_parser.add_argument("-u", "--url", help="URL of the upstream registry", default=UPSTREAM_URL)
+    args_parser.add_argument("-i", "--input", help="read the upstream registry from a local file instead")
+    args_parser.add_argument("--check", help="only check the bundled registry is up to date", action='store_true', default=False)
+
+    args = args_parser.parse_args()
+
+    if args.input is not None:
+        with open(args.input, 'rb') as file:
+            content = file.read()
+    else:
+        try:
+            with urlopen(args.url, timeout=30) as response:
+                content = response.read()
+        except (URLError, OSError) as exc:
+            print(f"Unable to download the upstream registry from {args.url} ({str(exc)}), use --input with a local copy")
+            sys.exit(1)
+
+    problems = validate_registry(content)
+    if len(problems) > 0:
+        print(f"The upstream registry is not valid: {len(problems)} problem(s)")
+        for problem in problems:
+            print(f"\t {problem}")
+        sys.exit(1)
+
+    with open(REGISTRY_PATH, 'rb') as file:
+        bundled = file.read()
+
+    if args.check:
+        if bundled != content:
+            print(f"{REGISTRY_PATH} differs from the upstream registry, run {sys.argv[0]} to update it")
+            sys.exit(1)
+
+        print(f"{REGISTRY_PATH}: up to date")
+        return
+
+    if bundled == content:
+        print(f"{REGISTRY_PATH}: already up to date")
+        return
+
+    with open(REGISTRY_PATH, 'wb') as file:
+        file.write(content)
+
+    print(f"{REGISTRY_PATH}: updated, {len(json.loads(content)['registry'])} networks")
+
+
+if __name__ == '__main__':
+    main()
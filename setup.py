@@ -13,8 +13,11 @@ REQUIRES_PYTHON = '>=3.6.0'
 VERSION = None
 LICENSE = 'MIT'
 REQUIRED = [
-    'substrate-interface>=0.13.3'
+    'substrate-interface>=1.7.0'
 ]
+EXTRAS = {
+    'breakdown': ['numpy'],
+}
 
 here = os.path.abspath(os.path.dirname(__file__))
 
@@ -44,11 +47,13 @@ setup(
         "Operating System :: OS Independent",
     ],
     packages=['payctl'],
+    package_data={'payctl': ['data/*.json']},
     entry_points={
         'console_scripts': ['payctl=payctl:main'],
     },
     data_files=[('etc/payctl', ['default.conf'])],
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     license=LICENSE,
     project_urls={ 
         'Bug Reports': 'https://github.com/stakelink/substrate-payctl/issues',
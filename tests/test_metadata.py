@@ -0,0 +1,20 @@
+import pytest
+
+from payctl.metadata import with_network_defaults
+
+
+KUSAMA = {'prefix': 2, 'symbol': 'KSM', 'decimals': 12}
+
+
+@pytest.mark.parametrize("properties, network_info, expected", [
+    # The chain properties are kept, the first token of multi-token chains is the native one
+    ({'ss58Format': 0, 'tokenDecimals': [10, 12], 'tokenSymbol': ['DOT', 'X']}, KUSAMA, {'ss58Format': 0, 'tokenDecimals': 10, 'tokenSymbol': 'DOT'}),
+    # Missing properties come from the registry entry, the address format included
+    ({'tokenSymbol': 'DOT'}, KUSAMA, {'ss58Format': 2, 'tokenDecimals': 12, 'tokenSymbol': 'DOT'}),
+    ({'ss58Format': None, 'tokenDecimals': []}, KUSAMA, {'ss58Format': 2, 'tokenDecimals': 12, 'tokenSymbol': 'KSM'}),
+    # Registry entries without a token (aliases) do not fill it
+    ({}, {'prefix': 42, 'symbol': None, 'decimals': None}, {'ss58Format': 42}),
+    (None, None, {}),
+])
+def test_with_network_defaults(properties, network_info, expected):
+    assert with_network_defaults(properties, network_info) == expected
@@ -0,0 +1,86 @@
+import pytest
+
+from payctl import rewards
+from payctl.utils import PERBILL, get_eras_payment_amounts, perbill_from_rational, perbill_mul
+
+
+# (p, q, parts) of Perbill::from_rational(p, q), which rounds down and saturates at one
+FROM_RATIONAL = [
+    (0, 7, 0),
+    (1, 3, 333_333_333),
+    (2, 3, 666_666_666),
+    (7, 10**9 + 1, 6),
+    (123_456_789, 987_654_321, 124_999_998),
+    (3, 3, PERBILL),
+    (5, 3, PERBILL),
+    (10**18, 3 * 10**18, 333_333_333),
+    (2**127, 2**128 - 1, 500_000_000),
+]
+
+# (parts, n, result) of Perbill * n, which rounds to the nearest and down on ties
+MUL = [
+    (0, 10**20, 0),
+    (PERBILL, 12_345, 12_345),
+    (333_333_333, 3, 1),
+    (350_000_000, 10, 3),
+    (360_000_000, 10, 4),
+    (500_000_000, 3, 1),
+    (500_000_000, 5, 2),
+    (1, 500_000_000, 0),
+    (1, 500_000_001, 1),
+    (123_456_789, 987_654_321_123_456_789, 121_932_631_127_876_848),
+    (500_000_000, 2**64 + 1, 2**63),
+    (333_333_333, 10**30 + 7, 333_333_333 * 10**21 + 2),
+    (999_999_999, 2**128 - 1, 340_282_366_580_656_096_542_436_143_968_393_604_023),
+]
+
+
+@pytest.mark.parametrize("p, q, parts", FROM_RATIONAL)
+def test_perbill_from_rational(p, q, parts):
+    assert perbill_from_rational(p, q) == parts
+
+
+@pytest.mark.parametrize("parts, n, result", MUL)
+def test_perbill_mul(parts, n, result):
+    assert perbill_mul(parts, n) == result
+
+
+def test_eras_payment_amounts():
+    eras_rewards = {
+        10: {'total': 3, 'individual': {'A': 1, 'B': 2}, 'reward': 10**12},
+        11: {'total': 20, 'individual': {'A': 7}, 'reward': 3},
+    }
+
+    assert get_eras_payment_amounts(eras_rewards, ['A', 'B', 'C']) == {
+        10: {'A': 333_333_333_000, 'B': 666_666_666_000},
+        11: {'A': 1},
+    }
+
+
+@pytest.fixture
+def np():
+    pytest.importorskip('numpy')
+    rewards.load_numpy()
+
+    return rewards.np
+
+
+@pytest.mark.parametrize("values", [
+    # int64 arrays, and object arrays for the values too large for them
+    [row for row in FROM_RATIONAL if row[1] < rewards.INT64_SAFE_LIMIT],
+    FROM_RATIONAL,
+])
+def test_perbill_from_rational_array(np, values):
+    p, q, parts = zip(*values)
+
+    assert list(rewards.perbill_from_rational_array(rewards.to_array(p), rewards.to_array(q))) == list(parts)
+
+
+@pytest.mark.parametrize("values", [
+    [row for row in MUL if row[1] < rewards.INT64_SAFE_LIMIT],
+    MUL,
+])
+def test_perbill_mul_array(np, values):
+    parts, n, result = zip(*values)
+
+    assert list(rewards.perbill_mul_array(rewards.to_array(parts), rewards.to_array(n))) == list(result)
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from payctl.plan import PLAN_VERSION, plan_digest, read_plan, write_plan
+
+
+PLAN = {
+    'version': PLAN_VERSION,
+    'network': 'kusama',
+    'genesis_hash': '0x' + '00' * 32,
+    'spec_version': 1002000,
+    'transaction_version': 26,
+    'block_number': 20000000,
+    'block_hash': '0x' + '11' * 32,
+    'signing_account': 'HNZata7iMYWmk5RvZRTiAsSDhV8366zq2YGb3tLH5Upf74F',
+    'nonce': 7,
+    'batch_mode': 'batch',
+    'extrinsics': [
+        {'call': '0x1234', 'expected_fee': 677000000, 'payouts': [[2030, 'GetZUSLFAaKorkQU8R67mA3mC15EpLRvk8199AB5DLbnb2E', 0]]},
+    ],
+}
+
+
+def write_content(path, content):
+    with open(path, 'w') as file:
+        json.dump(content, file)
+
+    return path
+
+
+def test_plan_round_trip(tmp_path):
+    write_plan(tmp_path / 'plan.json', PLAN)
+
+    assert read_plan(tmp_path / 'plan.json') == PLAN
+
+
+def test_plan_digest_is_canonical():
+    assert plan_digest(PLAN) == plan_digest(dict(reversed(list(PLAN.items()))))
+    assert plan_digest(PLAN) != plan_digest(dict(PLAN, nonce=8))
+
+
+def test_read_plan_modified(tmp_path):
+    write_plan(tmp_path / 'plan.json', PLAN)
+
+    with open(tmp_path / 'plan.json') as file:
+        content = json.load(file)
+    content['plan']['extrinsics'][0]['call'] = '0x5678'
+
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        read_plan(write_content(tmp_path / 'plan.json', content))
+
+
+def test_read_plan_version(tmp_path):
+    plan = dict(PLAN, version=PLAN_VERSION + 1)
+
+    with pytest.raises(ValueError, match="unsupported plan version"):
+        read_plan(write_content(tmp_path / 'plan.json', {'plan': plan, 'sha256': plan_digest(plan)}))
+
+
+@pytest.mark.parametrize("content", [
+    [],
+    {'plan': PLAN},
+    {'sha256': plan_digest(PLAN)},
+])
+def test_read_plan_not_a_plan(tmp_path, content):
+    with pytest.raises(ValueError, match="not a payout plan"):
+        read_plan(write_content(tmp_path / 'plan.json', content))
+
+
+def test_read_plan_invalid_json(tmp_path):
+    (tmp_path / 'plan.json').write_text('{"plan": ')
+
+    with pytest.raises(ValueError, match="invalid JSON"):
+        read_plan(tmp_path / 'plan.json')
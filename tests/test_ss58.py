@@ -0,0 +1,32 @@
+import pytest
+
+from payctl.ss58 import ss58_decode
+
+
+# Public key of the //Alice development account
+ALICE = bytes.fromhex('d43593c715fdd31c61141abd04a99fd6822c8558854ccde39a5684e7a56da27d')
+
+# (address, format) of the //Alice account on several networks, 2254 uses the two bytes prefix
+ADDRESSES = [
+    ('15oF4uVJwmo4TdGW7VfQxNLavjCXviqxT9S1MgbjMNHr6Sp5', 0),
+    ('HNZata7iMYWmk5RvZRTiAsSDhV8366zq2YGb3tLH5Upf74F', 2),
+    ('5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY', 42),
+    ('stB4S14whneyomiEa22Fu2PzVoibMB7n5PvBFUwafbCbRkC1K', 2254),
+]
+
+
+@pytest.mark.parametrize("address, ss58_format", ADDRESSES)
+def test_ss58_decode(address, ss58_format):
+    assert ss58_decode(address) == (ss58_format, ALICE)
+
+
+@pytest.mark.parametrize("address, error", [
+    ('', "empty address"),
+    ('5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQZ', "invalid address checksum"),
+    ('5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQ0', "invalid base58 character '0'"),
+    ('5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKut', "invalid address length"),
+    ('0x' + ALICE.hex(), "invalid base58 character '0'"),
+])
+def test_ss58_decode_invalid(address, error):
+    with pytest.raises(ValueError, match=error):
+        ss58_decode(address)